@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Comment
+from .page_cache import bump_global_generation, bump_post_generation
 
 
 @admin.register(Post)
@@ -39,11 +40,13 @@ class PostAdmin(admin.ModelAdmin):
     @admin.action(description='✅ Mark selected posts as published')
     def make_published(self, request, queryset):
         updated = queryset.update(status='published')
+        bump_global_generation()  # update() skips post_save
         self.message_user(request, f'{updated} post(s) marked as published.')
 
     @admin.action(description='📝 Mark selected posts as draft')
     def make_draft(self, request, queryset):
         updated = queryset.update(status='draft')
+        bump_global_generation()
         self.message_user(request, f'{updated} post(s) moved to draft.')
 
 
@@ -56,12 +59,18 @@ class CommentAdmin(admin.ModelAdmin):
     readonly_fields = ('created', 'updated')
     actions = ['approve_comments', 'reject_comments']
 
+    def _bump_comment_pages(self, queryset):
+        for slug in set(queryset.values_list('post__slug', flat=True)):
+            bump_post_generation(slug)
+
     @admin.action(description='✅ Approve selected comments')
     def approve_comments(self, request, queryset):
         updated = queryset.update(active=True)
+        self._bump_comment_pages(queryset)
         self.message_user(request, f'{updated} comment(s) approved.')
 
     @admin.action(description='🚫 Reject selected comments')
     def reject_comments(self, request, queryset):
         updated = queryset.update(active=False)
+        self._bump_comment_pages(queryset)
         self.message_user(request, f'{updated} comment(s) rejected.')
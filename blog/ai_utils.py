@@ -3,12 +3,14 @@ import time
 import logging
 import asyncio
 
-import httpx
-from openai import AsyncOpenAI
 from django.conf import settings
-from django.core.cache import cache
 from asgiref.sync import sync_to_async
+from blog.async_cache import async_cache
+from blog.circuit_breaker import CircuitBreaker
+from blog.context_packer import pack_context
+from blog.loops import for_running_loop
 from blog.redis_vectors import (
+    search_posts_async,
     search_similar_async,
     get_cached_embedding_async,
     cache_embedding_async,
@@ -24,47 +26,150 @@ SKIP_RAG_PATTERNS = {
     'whats up', "what's up", 'sup', 'yo', 'thank you', 'thx',
 }
 
+# Retrieval casts a wider net than fits; pack_context picks the best mix.
+# Chunk KNN is restricted to the RAG_POST_CANDIDATES nearest posts (post-level index).
+RAG_POST_CANDIDATES = 4
+RAG_POST_MAX_DISTANCE = 0.7
+RAG_VECTOR_CANDIDATES = 8
+RAG_TEXT_CANDIDATES = 5
+TEXT_MATCH_RELEVANCE = 0.45
+TEXT_MATCH_BOOST = 0.1  # found by both keyword and vector search
+
+# Type-ahead prefetch: only plausible questions, never queued behind each other.
+PREFETCH_MIN_CHARS = 12
+PREFETCH_MAX_CHARS = 500
+
 # Singleton instances
 _ai_client = None
-_httpx_client = None
+_httpx_clients = {}  # event loop → keep-alive transport
+_background_tasks = set()
+_prefetching = set()
+
+
+def _new_httpx_client():
+    import httpx
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.AI_READ_TIMEOUT,
+            connect=settings.AI_CONNECT_TIMEOUT,
+            pool=settings.AI_POOL_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.AI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.AI_KEEPALIVE_EXPIRY,
+        ),
+    )
 
 
 def _get_httpx_client():
-    """Reusable httpx client — avoids TCP/TLS handshake per request."""
-    global _httpx_client
-    if _httpx_client is None:
-        _httpx_client = httpx.AsyncClient(timeout=300.0)
-    return _httpx_client
+    """
+    The shared transport for the AI host on the running event loop — the
+    OpenAI SDK calls and raw streaming both use it, so every request on the
+    worker's loop draws from a single keep-alive pool.
+    """
+    return for_running_loop(_httpx_clients, _new_httpx_client, close=lambda client: client.aclose())
+
+
+def _is_backend_failure(exc: BaseException) -> bool:
+    """Errors that mean the AI host is down or overloaded (as opposed to a bad request)."""
+    import httpx
+    from openai import APIConnectionError, InternalServerError
+    if isinstance(exc, (httpx.TransportError, TimeoutError, APIConnectionError, InternalServerError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return False
 
 
 class LocalAIClient:
     """
     Async-First Local AI Client (Ollama).
     Raw httpx streaming for zero-latency SSE — bypasses the OpenAI library buffer.
+    All calls go through one circuit breaker and fail fast while it is open.
     """
-    def __init__(self, host, api_key):
+    def __init__(self, host, api_key, http_client=None):
         base_url = host if host.endswith('/v1') else f"{host.rstrip('/')}/v1"
         self._base_url = base_url
         self._api_key = api_key
-        self.client = AsyncOpenAI(
-            base_url=base_url,
-            api_key=api_key,
-            timeout=httpx.Timeout(120.0, connect=5.0),
+        # A private transport (see new_ai_client) or, by default, the running loop's shared one.
+        self._http_client = http_client
+        self._sdk_clients = {}  # event loop → (SDK client, embedding SDK client)
+        self.breaker = CircuitBreaker(
+            'ai',
+            failure_threshold=settings.AI_BREAKER_THRESHOLD,
+            reset_timeout=settings.AI_BREAKER_RESET,
         )
         self.completion_model = settings.AI_COMPLETION_MODEL
         self.embedding_model = settings.AI_EMBEDDING_MODEL
 
+    def _build_sdk_clients(self):
+        # The SDK is the heaviest import in the app; only load it once AI is actually used.
+        import httpx
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(
+            base_url=self._base_url,
+            api_key=self._api_key,
+            http_client=self._http(),
+            max_retries=0,  # completions are expensive and not worth repeating blindly
+        )
+        # Embeddings are idempotent and cheap: short timeout, bounded retries with backoff.
+        embedding_client = client.with_options(
+            timeout=httpx.Timeout(settings.AI_EMBEDDING_TIMEOUT, connect=settings.AI_CONNECT_TIMEOUT),
+            max_retries=settings.AI_EMBEDDING_RETRIES,
+        )
+        return client, embedding_client
+
+    def _http(self):
+        return self._http_client or _get_httpx_client()
+
+    @property
+    def client(self):
+        """OpenAI SDK client on this event loop's transport."""
+        return for_running_loop(self._sdk_clients, self._build_sdk_clients)[0]
+
+    @property
+    def _embedding_client(self):
+        return for_running_loop(self._sdk_clients, self._build_sdk_clients)[1]
+
+    async def aclose(self):
+        """Close a private transport. The shared per-loop ones live as long as their loop."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit is open — callers should skip optional AI work."""
+        return self.breaker.available
+
+    async def _guarded(self, call):
+        self.breaker.before_call()
+        try:
+            result = await call()
+        except Exception as e:
+            if _is_backend_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # the backend answered, just not happily
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return result
+
     async def list(self):
-        return await self.client.models.list()
+        return await self._guarded(self.client.models.list)
 
     async def generate(self, model, prompt, options=None):
         messages = [{"role": "user", "content": prompt}]
         try:
-            resp = await self.client.chat.completions.create(
+            resp = await self._guarded(lambda: self.client.chat.completions.create(
                 model=self.completion_model,
                 messages=messages,
                 temperature=options.get("temperature", 0.7) if options else 0.7
-            )
+            ))
             return {"response": resp.choices[0].message.content}
         except Exception as e:
             logger.error(f"Local AI Generate Error: {e}")
@@ -72,22 +177,31 @@ class LocalAIClient:
 
     async def embeddings(self, model, prompt):
         try:
-            resp = await self.client.embeddings.create(input=[prompt], model=self.embedding_model)
+            resp = await self._guarded(lambda: self._embedding_client.embeddings.create(
+                input=[prompt], model=self.embedding_model,
+            ))
             return {"embedding": resp.data[0].embedding}
         except Exception as e:
             logger.error(f"Local AI Embeddings Error: {e}")
             raise
 
-    async def chat(self, model, messages, stream, options=None):
+    async def chat(self, model, messages, stream, options=None, cache_hints=None):
+        """
+        `cache_hints` are extra request fields that ask the model server to keep
+        and reuse the prompt's KV cache (merged over AI_PROMPT_CACHE_HINTS).
+        Servers ignore fields they don't know.
+        """
         options = options or {}
+        hints = {**settings.AI_PROMPT_CACHE_HINTS, **(cache_hints or {})}
 
         if not stream:
-            resp = await self.client.chat.completions.create(
+            resp = await self._guarded(lambda: self.client.chat.completions.create(
                 model=self.completion_model,
                 messages=messages,
                 temperature=options.get("temperature", 0.7),
                 top_p=options.get("top_p", 1.0),
-            )
+                extra_body=hints or None,
+            ))
             return {"message": {"content": resp.choices[0].message.content}}
 
         # ── Raw httpx streaming ───────────────────────────────────────────────
@@ -102,34 +216,49 @@ class LocalAIClient:
             "top_p": options.get("top_p", 1.0),
             # Ollama: cap context window to avoid RAM spikes on the Mac host
             "num_ctx": options.get("num_ctx", 4096),
+            **hints,
         }
         headers = {
             "Authorization": f"Bearer {self._api_key}",
             "Content-Type": "application/json",
         }
+        breaker = self.breaker
+        breaker.before_call()  # raise now, before the view starts streaming
 
         async def generate_chunks():
             start_time = time.time()
+            first_token_time = None
             actual_chunks = 0
-            http = _get_httpx_client()
+            http = self._http()
+            settled = False
             try:
-                async with http.stream("POST", url, json=payload, headers=headers) as resp:
-                    async for line in resp.aiter_lines():
-                        if not line.startswith("data: "):
-                            continue
-                        data_str = line[6:].strip()
-                        if data_str == "[DONE]":
-                            break
-                        try:
-                            data = json.loads(data_str)
-                            choices = data.get("choices", [])
-                            if choices:
-                                content = choices[0].get("delta", {}).get("content") or ""
-                                if content:
-                                    actual_chunks += 1
-                                    yield {"message": {"content": content}, "done": False}
-                        except json.JSONDecodeError:
-                            continue
+                # The first-byte deadline covers connect, queueing and prompt
+                # prefill; once tokens flow only the per-read timeout applies.
+                async with asyncio.timeout(settings.AI_FIRST_BYTE_TIMEOUT) as first_byte:
+                    async with http.stream("POST", url, json=payload, headers=headers) as resp:
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if not settled:
+                                first_byte.reschedule(None)
+                                breaker.record_success()
+                                settled = True
+                            if not line.startswith("data: "):
+                                continue
+                            data_str = line[6:].strip()
+                            if data_str == "[DONE]":
+                                break
+                            try:
+                                data = json.loads(data_str)
+                                choices = data.get("choices", [])
+                                if choices:
+                                    content = choices[0].get("delta", {}).get("content") or ""
+                                    if content:
+                                        if first_token_time is None:
+                                            first_token_time = time.time()
+                                        actual_chunks += 1
+                                        yield {"message": {"content": content}, "done": False}
+                            except json.JSONDecodeError:
+                                continue
 
                 duration_ns = int((time.time() - start_time) * 1e9)
                 yield {
@@ -137,10 +266,19 @@ class LocalAIClient:
                     "total_duration": duration_ns,
                     "eval_count": actual_chunks,
                     "eval_duration": duration_ns,
+                    # Time to first token: mostly prompt prefill, so it shows KV-cache reuse.
+                    "first_token_duration": int(((first_token_time or time.time()) - start_time) * 1e9),
                 }
             except Exception as e:
+                if _is_backend_failure(e):
+                    breaker.record_failure()
+                elif not settled:
+                    breaker.record_success()
                 logger.error(f"Raw stream error: {e}")
                 raise
+            finally:
+                if not settled:
+                    breaker.release()  # cancelled before the backend answered
 
         return generate_chunks()
 
@@ -156,6 +294,19 @@ def get_ai_client():
     return _ai_client
 
 
+def new_ai_client():
+    """
+    A client with its own transport, for AI work on a short-lived event loop
+    (management commands, signal threads). Use it on one loop only and
+    `await client.aclose()` there when done.
+    """
+    return LocalAIClient(
+        host=settings.AI_HOST,
+        api_key=settings.AI_API_KEY,
+        http_client=_new_httpx_client(),
+    )
+
+
 async def check_ai_status():
     """Check if AI host is reachable and responding."""
     client = get_ai_client()
@@ -169,7 +320,7 @@ async def check_ai_status():
 
 async def get_site_inventory() -> str:
     """Compact site inventory — cached for 5 minutes to avoid DB hits."""
-    cached = cache.get("rag:site_inventory")
+    cached = await async_cache.get("rag:site_inventory")
     if cached is not None:
         return cached
 
@@ -179,7 +330,7 @@ async def get_site_inventory() -> str:
     @sync_to_async
     def _fetch():
         posts = list(Post.published.all().order_by('-publish')[:5])
-        tags = list(Tag.objects.all().values_list('name', flat=True))
+        tags = list(Tag.objects.order_by('name').values_list('name', flat=True))  # stable prompt prefix
         return posts, tags
 
     try:
@@ -192,23 +343,50 @@ async def get_site_inventory() -> str:
             lines.append(f"- \"{p.title}\" ({p.publish.strftime('%Y-%m-%d')}) → {p.get_absolute_url()}")
 
         result = (len(posts), "\n".join(lines))
-        cache.set("rag:site_inventory", result, timeout=300)  # 5 min cache
+        await async_cache.set("rag:site_inventory", result, timeout=300)  # 5 min cache
         return result
     except Exception as e:
         logger.error(f"Site inventory error: {e}")
         return 0, ""
 
 
-async def generate_rag_context(user_msg: str, client) -> str:
+def _score_and_pack(text_results, vector_results) -> str:
+    """Vector hits score by similarity; keyword-only hits get a flat score."""
+    candidates = {}
+    for match in vector_results:
+        candidates[match.get('content', '')] = {**match, 'relevance': max(0.0, 1.0 - match.get('distance', 1.0))}
+    for match in text_results:
+        content = match.get('content', '')
+        if content in candidates:
+            candidates[content]['relevance'] = min(1.0, candidates[content]['relevance'] + TEXT_MATCH_BOOST)
+        else:
+            candidates[content] = {**match, 'relevance': TEXT_MATCH_RELEVANCE}
+    return pack_context(list(candidates.values()), settings.AI_CONTEXT_TOKEN_BUDGET)
+
+
+def _keep_running(task):
+    """Hold a reference so a late stage can finish (and fill caches) after its request moved on."""
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def generate_rag_context(user_msg: str, client, skipped: list | None = None, budget: float | None = None) -> str:
     """
     RAG pipeline optimized for speed:
     - Skip RAG for small talk
     - Embedding + text search run in TRUE parallel
-    - Hard 1200 char context cap
-    - Site inventory cached for 5 min
+    - Two-level vector search: nearest posts first, then chunk KNN within them
+    - Token-budgeted, diversity-aware packing (see context_packer)
+    - Retrieval shares a budget of `budget` (default AI_RAG_DEADLINE) seconds.
+      Stages that miss it are left out of this answer (their names are appended
+      to `skipped`) but keep running, so the embedding and the complete
+      excerpts are cached for the next ask.
+    Returns only the per-query excerpts ('' when nothing matched) — the site
+    inventory is a separate, stable prompt layer (see build_chat_messages).
     """
-    MAX_CONTEXT_CHARS = 1200
-
+    budget = settings.AI_RAG_DEADLINE if budget is None else budget
+    deadline = asyncio.get_running_loop().time() + budget
     try:
         msg_lower = user_msg.lower().strip()
         if msg_lower in SKIP_RAG_PATTERNS or len(msg_lower) < 3:
@@ -217,88 +395,140 @@ async def generate_rag_context(user_msg: str, client) -> str:
         # ── Semantic Context Cache ────────────────────────────────────────────
         import hashlib
         msg_hash = hashlib.md5(msg_lower.encode()).hexdigest()[:16]
-        cache_key = f"rag:context:{msg_hash}"
-        cached_context = cache.get(cache_key)
-        if cached_context:
+        cache_key = f"rag:excerpts:{msg_hash}"
+        cached_context = await async_cache.get(cache_key)
+        if cached_context is not None:
             return cached_context
 
-        post_count, site_inventory = await get_site_inventory()
+        post_count, _ = await get_site_inventory()
         if post_count == 0:
             return "NO_RAG_NEEDED"
 
         # ── TRUE Parallel Search ──────────────────────────────────────────────
-        # Fire text search AND embedding generation at the same time.
-        text_results, vector_results = [], []
+        # Fire text search AND embedding generation at the same time; vector
+        # search starts as soon as the embedding is ready.
+        async def _text_search():
+            try:
+                return await text_search_async(user_msg, top_k=RAG_TEXT_CANDIDATES)
+            except Exception as e:
+                logger.warning(f"Text search error: {e}")
+                return []
 
         async def _get_embedding():
-            embedding = await get_cached_embedding_async(user_msg)
-            if not embedding:
-                emb_resp = await client.embeddings(model=None, prompt=user_msg)
-                embedding = emb_resp['embedding']
-                await cache_embedding_async(user_msg, embedding)
-            return embedding
-
-        try:
-            text_task = text_search_async(user_msg, top_k=3)
-            emb_task = _get_embedding()
-            text_results, embedding = await asyncio.gather(
-                text_task, emb_task, return_exceptions=True
-            )
-
-            if isinstance(text_results, Exception):
-                logger.warning(f"Text search error: {text_results}")
-                text_results = []
-            if isinstance(embedding, Exception):
-                logger.warning(f"Embedding error: {embedding}")
-                embedding = None
-
-            if embedding and not isinstance(embedding, Exception):
-                vector_results = await search_similar_async(embedding, top_k=4, max_distance=0.55)
-        except Exception as e:
-            logger.warning(f"RAG search error: {e}")
-
-        # ── Rank & Deduplicate ────────────────────────────────────────────────
-        seen, ranked = set(), []
-        for match in list(vector_results) + list(text_results):
-            key = match.get('content', '')[:80]
-            if key and key not in seen:
-                seen.add(key)
-                ranked.append(match)
-
-        if not ranked:
-            return site_inventory
-
-        context_parts = []
-        total_chars = 0
-        for chunk in ranked:
-            title = chunk.get('title', 'Unknown')
-            snippet = chunk.get('content', '')[:500].strip()
-            if not snippet:
-                continue
-            entry = f"### {title}\n{snippet}"
-            if total_chars + len(entry) > MAX_CONTEXT_CHARS:
-                break
-            context_parts.append(entry)
-            total_chars += len(entry)
-
-        if not context_parts:
-            final_context = site_inventory
-        else:
-            final_context = site_inventory + "\n\n" + "\n\n".join(context_parts)
+            try:
+                embedding = await get_cached_embedding_async(user_msg)
+                if not embedding and not client.available:
+                    return None  # AI backend circuit open — text search only
+                if not embedding:
+                    emb_resp = await client.embeddings(model=None, prompt=user_msg)
+                    embedding = emb_resp['embedding']
+                    await cache_embedding_async(user_msg, embedding)
+                return embedding
+            except Exception as e:
+                logger.warning(f"Embedding error: {e}")
+                return None
 
-        # Store in cache for 5 minutes (300s)
-        cache.set(cache_key, final_context, timeout=300)
-        return final_context
+        async def _vector_search():
+            embedding = await emb_task
+            if not embedding:
+                return []
+            try:
+                posts = await search_posts_async(embedding, top_k=RAG_POST_CANDIDATES, max_distance=RAG_POST_MAX_DISTANCE)
+                # No post-level hits (or no post index yet): fall back to searching every chunk.
+                return await search_similar_async(
+                    embedding, top_k=RAG_VECTOR_CANDIDATES, max_distance=0.55,
+                    post_ids=[p['post_id'] for p in posts] or None,
+                )
+            except Exception as e:
+                logger.warning(f"Vector search error: {e}")
+                return []
+
+        async def _complete():
+            text_results, vector_results = await asyncio.gather(text_task, vector_task)
+            context = _score_and_pack(text_results, vector_results)
+            await async_cache.set(cache_key, context, timeout=300)  # 5 min cache
+            return context
+
+        text_task = _keep_running(asyncio.create_task(_text_search()))
+        emb_task = _keep_running(asyncio.create_task(_get_embedding()))
+        vector_task = _keep_running(asyncio.create_task(_vector_search()))
+        complete_task = _keep_running(asyncio.create_task(_complete()))
+
+        # ── Deadline ──────────────────────────────────────────────────────────
+        remaining = max(0.0, deadline - asyncio.get_running_loop().time())
+        done, _ = await asyncio.wait({complete_task}, timeout=remaining)
+        if complete_task in done:
+            return complete_task.result()
+
+        # Answer from what is ready; the complete result lands in the cache later.
+        late = [name for name, task in (
+            ('text_search', text_task), ('embedding', emb_task), ('vector_search', vector_task),
+        ) if not task.done()]
+        logger.info(f"RAG deadline missed after {budget}s, skipped: {', '.join(late)}")
+        if skipped is not None:
+            skipped.extend(late)
+        return _score_and_pack(
+            text_task.result() if text_task.done() else [],
+            vector_task.result() if vector_task.done() else [],
+        )
 
     except Exception as e:
         logger.error(f"RAG pipeline error: {e}")
         return "NO_RAG_NEEDED"
 
 
-def get_rag_system_prompt(context: str) -> str:
-    """System prompt kept minimal to reduce prefill tokens → faster first output token."""
-    return (
-        "You are Ding AI for iooding.local. Answer using the blog content below. "
-        "Use markdown. Link posts as [Title](url). Be concise.\n\n"
-        f"--- Blog ---\n{context}\n---"
-    )
+async def prefetch_rag_context(user_msg: str, client) -> bool:
+    """
+    Warm the embedding and excerpt caches for a message the user is still
+    typing, so that chat_api finds retrieval already done. Returns False when
+    skipped: implausible length or small talk, AI backend unavailable, the same
+    text already in flight, or AI_PREFETCH_MAX_INFLIGHT prefetches already
+    running in this worker — prefetch drops work rather than queueing it.
+    """
+    text = user_msg.strip()
+    key = text.lower()
+    if not PREFETCH_MIN_CHARS <= len(text) <= PREFETCH_MAX_CHARS or key in SKIP_RAG_PATTERNS:
+        return False
+    if not client.available or key in _prefetching or len(_prefetching) >= settings.AI_PREFETCH_MAX_INFLIGHT:
+        return False
+    _prefetching.add(key)
+    try:
+        # Nobody is waiting on the answer, so no partial results: hold the
+        # in-flight slot until retrieval has really finished.
+        await generate_rag_context(
+            text, client, budget=settings.AI_EMBEDDING_TIMEOUT * (settings.AI_EMBEDDING_RETRIES + 1),
+        )
+    finally:
+        _prefetching.discard(key)
+    return True
+
+
+# ─── Prompt Assembly ──────────────────────────────────────────────────────────
+# Layered from most to least stable so the model server can reuse its KV cache:
+#   1. persona (never changes)  2. site inventory (changes when posts change)
+#   3. conversation summary + recent turns (change only at compaction / append)
+#   4. this turn's excerpts + question.
+# Anything per-query must stay in the last message, or every turn re-prefills.
+
+PERSONA_PROMPT = (
+    "You are Ding AI for iooding.local. Use markdown. Link posts as [Title](url). "
+    "Be concise. When the user's message includes blog excerpts, answer from them."
+)
+
+
+def build_chat_messages(history: list, user_msg: str, inventory: str = "", excerpts: str = "",
+                        summary: str = "") -> list:
+    """`history` must already fit the token budget (see conversations.prompt_history)."""
+    system = PERSONA_PROMPT
+    if inventory:
+        system += f"\n\n--- Blog ---\n{inventory}\n---"
+    if summary:
+        # Inside the single system message: some chat templates reject a second one.
+        system += f"\n\n--- Earlier in this conversation ---\n{summary}\n---"
+    if excerpts:
+        user_msg = f"--- Excerpts ---\n{excerpts}\n---\n\n{user_msg}"
+    return [
+        {'role': 'system', 'content': system},
+        *history,
+        {'role': 'user', 'content': user_msg},
+    ]
@@ -0,0 +1,103 @@
+"""
+Static asset bundles.
+
+Our own CSS/JS and the vendor files every page needs are concatenated into
+`static/bundle/site.{css,js}` by the `build_assets` command (run it before
+`collectstatic`; the Dockerfile and entrypoint do). Sources are concatenated
+as-is, not minified: the manifest storage gives the bundles content-hashed
+names with gzip and Brotli variants, which WhiteNoise serves as immutable,
+and compression makes up most of what minifying would save.
+With DEBUG on, templates link the source files directly so no build is needed.
+"""
+import os
+import posixpath
+import re
+
+from django.conf import settings
+
+BUNDLE_DIR = 'bundle'
+
+# Order matters: JS bundle members run in sequence, main.js last.
+BUNDLES = {
+    'site.css': [
+        'vendor/css/fonts.css',
+        'vendor/css/bootstrap.min.css',
+        'css/style.css',
+    ],
+    'site.js': [
+        'vendor/js/bootstrap.bundle.min.js',
+        'vendor/js/htmx.min.js',
+        'vendor/js/marked.min.js',
+        'js/main.js',
+    ],
+}
+
+PRELOAD_FONTS = ['vendor/fonts/outfit-latin.woff2']
+
+CSS_IMPORT_RE = re.compile(r'@import\s+url\([^)]*\)\s*;|@import\s+["\'][^"\']*["\']\s*;')
+CSS_URL_RE = re.compile(r'url\(\s*(["\']?)([^)"\']+)\1\s*\)')
+SOURCE_MAP_RE = re.compile(r'^\s*(//[#@]\s*sourceMappingURL=.*|/\*[#@]\s*sourceMappingURL=.*\*/)\s*$', re.M)
+
+
+def bundle_path(name: str) -> str:
+    return posixpath.join(BUNDLE_DIR, name)
+
+
+def source_root():
+    return settings.STATICFILES_DIRS[0]
+
+
+def _rebase_urls(css: str, source: str, target: str) -> str:
+    """Rewrite relative url()s so they resolve from the bundle's location."""
+    source_dir = posixpath.dirname(source)
+    target_dir = posixpath.dirname(target)
+
+    def _rewrite(match):
+        quote, url = match.groups()
+        if re.match(r'^(data:|https?:|//|/|#)', url):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(source_dir, url))
+        return f'url({quote}{posixpath.relpath(resolved, target_dir)}{quote})'
+
+    return CSS_URL_RE.sub(_rewrite, css)
+
+
+def build_bundle(name: str) -> str:
+    target = bundle_path(name)
+    root = source_root()
+    parts, imports = [], []
+    for source in BUNDLES[name]:
+        with open(os.path.join(root, source), encoding='utf-8') as f:
+            # The .map files aren't bundled; a dangling pragma would 404 in devtools.
+            content = SOURCE_MAP_RE.sub('', f.read()).strip()
+        if name.endswith('.css'):
+            content = _rebase_urls(content, source, target)
+            # @import is only valid at the top of a stylesheet — hoist it.
+            imports.extend(CSS_IMPORT_RE.findall(content))
+            parts.append(CSS_IMPORT_RE.sub('', content))
+        else:
+            parts.append(content)
+
+    if name.endswith('.css'):
+        return '\n'.join(imports + parts) + '\n'
+    return ';\n'.join(parts) + ';\n'
+
+
+def write_bundles() -> dict:
+    """Build every bundle into the source static dir. Returns {path: bytes written}."""
+    written = {}
+    out_dir = os.path.join(source_root(), BUNDLE_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    for name in BUNDLES:
+        content = build_bundle(name)
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+        written[bundle_path(name)] = len(content.encode())
+    return written
+
+
+def bundle_files(name: str) -> list:
+    """Static paths a template should link for this bundle."""
+    if settings.DEBUG:
+        return list(BUNDLES[name])
+    return [bundle_path(name)]
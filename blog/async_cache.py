@@ -0,0 +1,88 @@
+"""
+Non-blocking cache access for async views.
+
+django-redis only has a synchronous client, and Django's `cache.aget()` just
+runs it in a worker thread. This facade talks to the same Redis through the
+async client in `redis_vectors`, reusing django-redis' key function and
+serializer so values written here are readable by `cache.get()` and vice versa.
+With a non-Redis cache backend (tests, local dev) it falls back to `cache.a*`.
+
+    from blog.async_cache import async_cache
+    value = await async_cache.get('rag:site_inventory')
+"""
+import logging
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCache:
+    @property
+    def _codec(self):
+        """django-redis client (for make_key/encode/decode), or None for other backends."""
+        client = getattr(cache, 'client', None)
+        return client if hasattr(client, 'encode') else None
+
+    def _redis(self):
+        from .redis_vectors import get_async_redis_client
+        return get_async_redis_client()
+
+    def _timeout_ms(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = cache.default_timeout
+        return None if timeout is None else int(timeout * 1000)
+
+    async def get(self, key, default=None):
+        codec = self._codec
+        if codec is None:
+            return await cache.aget(key, default)
+        try:
+            value = await self._redis().get(codec.make_key(key))
+        except Exception as e:
+            logger.warning(f"Async cache get failed for {key}: {e}")
+            return default
+        return default if value is None else codec.decode(value)
+
+    async def get_many(self, keys) -> dict:
+        codec = self._codec
+        if codec is None:
+            return await cache.aget_many(keys)
+        if not keys:
+            return {}
+        try:
+            values = await self._redis().mget([codec.make_key(k) for k in keys])
+        except Exception as e:
+            logger.warning(f"Async cache get_many failed: {e}")
+            return {}
+        return {k: codec.decode(v) for k, v in zip(keys, values) if v is not None}
+
+    async def set(self, key, value, timeout=DEFAULT_TIMEOUT) -> bool:
+        codec = self._codec
+        if codec is None:
+            await cache.aset(key, value, timeout)
+            return True
+        timeout_ms = self._timeout_ms(timeout)
+        try:
+            if timeout_ms is not None and timeout_ms <= 0:
+                # Same as django-redis: a non-positive timeout expires the key now.
+                await self._redis().delete(codec.make_key(key))
+                return True
+            return bool(await self._redis().set(codec.make_key(key), codec.encode(value), px=timeout_ms))
+        except Exception as e:
+            logger.warning(f"Async cache set failed for {key}: {e}")
+            return False
+
+    async def delete(self, key) -> bool:
+        codec = self._codec
+        if codec is None:
+            return await cache.adelete(key)
+        try:
+            return bool(await self._redis().delete(codec.make_key(key)))
+        except Exception as e:
+            logger.warning(f"Async cache delete failed for {key}: {e}")
+            return False
+
+
+async_cache = AsyncCache()
@@ -0,0 +1,148 @@
+"""
+Helpers shared by the diagnostic commands (loadtest, benchmark_views,
+profile_startup) and the test suite.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+
+
+# SQL statements per request (measured on PostgreSQL with pg_trgm; blog.tests
+# asserts them exactly). Cold: page and fragment caches empty, global generation
+# set (see cold_cache). Warm: the same request again — page-cached views must
+# not touch the database.
+QUERY_BUDGETS = {
+    'post_list':          (4, 0),
+    'post_list_page':     (4, 0),
+    'post_list_tag':      (5, 0),
+    'post_list_search':   (3, None),
+    'post_detail':        (5, 0),
+    'post_detail_deep':   (5, 0),
+    'search_live':        (2, None),
+    'search_live_neural': (3, None),
+    'sitemap_index':      (2, 0),
+    'sitemap_section':    (2, 0),
+}
+
+
+def cold_cache():
+    """
+    Empty every cache, then seed the global generation the way the first post
+    save does in production — without it sitemaps deliberately skip caching.
+    """
+    from django.core.cache import cache
+    from blog.page_cache import bump_global_generation
+
+    cache.clear()
+    bump_global_generation()
+
+
+class FakeVectorBackend:
+    """In-memory stand-in for the Redis embedding cache and post vector index."""
+
+    def __init__(self, post_ids):
+        self.post_ids = list(post_ids)
+        self.embeddings = {}
+
+    async def get_cached_embedding(self, text):
+        return self.embeddings.get(text)
+
+    async def cache_embedding(self, text, embedding):
+        self.embeddings[text] = embedding
+
+    async def search_posts(self, query_embedding, top_k=5, max_distance=None):
+        rng = random.Random(len(self.embeddings))
+        ids = rng.sample(self.post_ids, min(top_k, len(self.post_ids)))
+        return [{'post_id': pid, 'title': '', 'distance': 0.1 * i} for i, pid in enumerate(ids)]
+
+
+class FakeAIClient:
+    """Stands in for LocalAIClient so the commands need no model server."""
+    available = True
+
+    async def embeddings(self, model=None, prompt=''):
+        from blog.redis_vectors import VECTOR_DIM
+        return {'embedding': [0.0] * VECTOR_DIM}
+
+    async def chat(self, model=None, messages=None, stream=False, options=None):
+        async def _stream():
+            for word in ('Event ', 'loop ', 'check.'):
+                await asyncio.sleep(0)
+                yield {'message': {'content': word}}
+            yield {'done': True, 'total_duration': 1, 'eval_count': 3, 'eval_duration': 1}
+        return _stream()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# ─── Worker boot ─────────────────────────────────────────────────────────────
+
+# Heavy dependencies that must load on first use, never at worker boot.
+LAZY_MODULES = ('openai', 'httpx', 'markdown', 'pygments', 'redis.commands.search')
+BOOT_IMPORT_BUDGET_MS = 1200  # -X importtime inflates this; a plain boot takes well under half
+
+# What a gunicorn/uvicorn worker does before answering its first request.
+BOOT_SCRIPT = r"""
+import json, sys, time
+started = time.perf_counter()
+import iooding.asgi
+from django.urls import get_resolver
+get_resolver().url_patterns  # the URLconf (and so blog.views) loads on the first request
+boot_ms = (time.perf_counter() - started) * 1000
+
+rss_kb = 0
+try:
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+except (OSError, StopIteration):
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+eager = [m for m in sys.argv[1:] if m in sys.modules]
+print(json.dumps({'boot_ms': boot_ms, 'rss_kb': rss_kb, 'eager': eager}))
+"""
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def boot_worker(base_dir) -> dict:
+    """
+    Boot the app in a fresh interpreter under -X importtime. Returns boot_ms,
+    rss_kb, eager (LAZY_MODULES that got imported), import_ms and packages
+    (self time per top-level package, slowest first). Raises RuntimeError when
+    the boot fails.
+    """
+    env = {**os.environ, 'HEALTH_PROBER_ENABLED': 'false', 'PYTHONDONTWRITEBYTECODE': '1'}
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'iooding.settings')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT, *LAZY_MODULES],
+        cwd=base_dir, env=env, capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Boot failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # -X importtime: "self us | cumulative us | <indent>module"; depth-0 lines are disjoint.
+    total_us, by_package = 0, {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+        package = module.split('.')[0]
+        by_package[package] = by_package.get(package, 0) + int(self_us)
+    result['import_ms'] = total_us / 1000
+    result['packages'] = sorted(((p, us / 1000) for p, us in by_package.items()), key=lambda x: -x[1])
+    return result
@@ -0,0 +1,176 @@
+"""
+Resumable chat generations backed by Redis Streams.
+
+A generation runs in a background task that appends each SSE frame to
+chat:stream:<id> as it is produced; HTTP responses only read that stream and
+tag every event with its entry id. So:
+
+- a client that drops mid-answer reconnects with `Last-Event-ID` and gets the
+  rest, while the generation carries on without it;
+- a second tab sending the same message in the same conversation attaches to
+  the generation already running (chat:inflight:<hash>) instead of paying for
+  another one.
+
+Streams are capped at STREAM_MAXLEN entries and expire AI_STREAM_BUFFER_TTL
+seconds after their last event. A final entry without a frame marks the end.
+
+A generation stops early (closing the model stream) when the client asks for
+it (chat:cancel:<id>, set by the Stop button) or when no reader has been
+attached for READER_GRACE seconds — readers renew a lease (chat:readers:<id>)
+while they wait, so a dropped client still has time to resume.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import re
+import uuid
+
+from django.conf import settings
+
+from .redis_vectors import _decode, get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+STREAM_MAXLEN = 2000
+READ_BLOCK_MS = 15000
+READER_GRACE = READ_BLOCK_MS // 1000 + 10  # seconds: longer than one blocking read
+KEEPALIVE = ": keep-alive\n\n"
+CANCELLED_FRAME = 'data: {"error": "Generation stopped."}\n\n'
+EVENT_ID_RE = re.compile(r'^\d+-\d+$')
+STREAM_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+_generations = set()
+
+
+def stream_key(stream_id: str) -> str:
+    return f"chat:stream:{stream_id}"
+
+
+def cancel_key(stream_id: str) -> str:
+    return f"chat:cancel:{stream_id}"
+
+
+def reader_key(stream_id: str) -> str:
+    return f"chat:readers:{stream_id}"
+
+
+def _inflight_key(conversation_id: str, user_msg: str) -> str:
+    digest = hashlib.sha256(f"{conversation_id}\0{user_msg}".encode()).hexdigest()[:32]
+    return f"chat:inflight:{digest}"
+
+
+def new_stream_id() -> str:
+    return uuid.uuid4().hex
+
+
+def parse_last_event_id(value) -> str:
+    """A Redis entry id from the client, or '0-0' (replay from the start)."""
+    value = (value or '').strip()
+    return value if EVENT_ID_RE.match(value) else '0-0'
+
+
+async def claim_generation(conversation_id: str, user_msg: str, stream_id: str):
+    """
+    Register `stream_id` as the generation for this message. Returns None when
+    claimed, or the id of the generation already running for it. Raises when
+    Redis is unreachable — callers then stream directly.
+    """
+    r = get_async_redis_client()
+    key = _inflight_key(conversation_id, user_msg)
+    if await r.set(key, stream_id, nx=True, ex=settings.AI_STREAM_BUFFER_TTL):
+        return None
+    existing = _decode(await r.get(key))
+    if existing and await r.exists(stream_key(existing)):
+        return existing
+    # The previous owner died before writing anything; take over.
+    await r.set(key, stream_id, ex=settings.AI_STREAM_BUFFER_TTL)
+    return None
+
+
+async def request_cancel(stream_id: str):
+    """Ask the generation to stop; it notices on its next frame."""
+    await get_async_redis_client().set(cancel_key(stream_id), 1, ex=settings.AI_STREAM_BUFFER_TTL)
+
+
+async def _publish(stream_id: str, frames, inflight: str):
+    r = get_async_redis_client()
+    key = stream_key(stream_id)
+    ttl = settings.AI_STREAM_BUFFER_TTL
+    try:
+        # The request that started the generation is about to attach.
+        await r.set(reader_key(stream_id), 1, ex=READER_GRACE)
+        async for frame in frames:
+            # Cancellation and reader checks ride along with the write: no extra round trip.
+            pipe = r.pipeline(transaction=False)
+            pipe.xadd(key, {'frame': frame}, maxlen=STREAM_MAXLEN, approximate=True)
+            pipe.expire(key, ttl)
+            pipe.exists(cancel_key(stream_id))
+            pipe.exists(reader_key(stream_id))
+            _, _, cancelled, readers = await pipe.execute()
+            if cancelled or not readers:
+                logger.info(f"Chat stream {stream_id} stopped: {'cancelled' if cancelled else 'no readers'}")
+                await r.xadd(key, {'frame': CANCELLED_FRAME}, maxlen=STREAM_MAXLEN, approximate=True)
+                break
+    except Exception as e:
+        logger.error(f"Chat stream {stream_id} aborted: {e}")
+    finally:
+        # Closes the model's HTTP stream when the generation stopped early.
+        await frames.aclose()
+        try:
+            pipe = r.pipeline(transaction=False)
+            pipe.xadd(key, {'end': '1'}, maxlen=STREAM_MAXLEN, approximate=True)
+            pipe.expire(key, ttl)
+            await pipe.execute()
+            if _decode(await r.get(inflight)) == stream_id:
+                await r.delete(inflight)
+        except Exception as e:
+            logger.warning(f"Chat stream {stream_id} not closed cleanly: {e}")
+
+
+def start_generation(stream_id: str, frames, conversation_id: str, user_msg: str):
+    """
+    Drive the async iterator of SSE frames to completion in the background.
+    The task gets a fresh context: the request's thread-sensitive executor is
+    shut down when its response ends, and the generation outlives it.
+    """
+    task = asyncio.create_task(
+        _publish(stream_id, frames, _inflight_key(conversation_id, user_msg)),
+        context=contextvars.Context(),
+    )
+    _generations.add(task)
+    task.add_done_callback(_generations.discard)
+    return task
+
+
+async def stream_exists(stream_id: str) -> bool:
+    return bool(await get_async_redis_client().exists(stream_key(stream_id)))
+
+
+async def read_stream(stream_id: str, last_id: str = '0-0'):
+    """
+    Yield SSE frames with `id:` lines after `last_id` until the generation ends.
+    Sends a keep-alive comment while the model is quiet, and gives up once the
+    stream has been silent longer than any live generation could be.
+    """
+    r = get_async_redis_client()
+    key = stream_key(stream_id)
+    loop = asyncio.get_running_loop()
+    idle_limit = settings.AI_READ_TIMEOUT + settings.AI_FIRST_BYTE_TIMEOUT
+    last_event = loop.time()
+    while True:
+        await r.set(reader_key(stream_id), 1, ex=READER_GRACE)
+        response = await r.xread({key: last_id}, count=100, block=READ_BLOCK_MS)
+        if not response:
+            if loop.time() - last_event > idle_limit or not await r.exists(key):
+                yield 'data: {"error": "The answer stream was interrupted. Please try again."}\n\n'
+                return
+            yield KEEPALIVE
+            continue
+        last_event = loop.time()
+        for entry_id, fields in response[0][1]:
+            last_id = _decode(entry_id)
+            frame = fields.get(b'frame')
+            if frame is None:
+                return
+            yield f"id: {last_id}\n{_decode(frame)}"
@@ -0,0 +1,75 @@
+"""
+Per-process circuit breaker for the local AI backend.
+
+After `failure_threshold` consecutive failures the circuit opens and calls
+fail immediately with `CircuitOpenError` instead of waiting out connect and
+read timeouts. Once `reset_timeout` seconds have passed a single trial call
+is let through (half-open): success closes the circuit, failure re-opens it.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started_at = None
+
+    @property
+    def _trial_in_flight(self) -> bool:
+        # A trial whose caller vanished without reporting back must not wedge the circuit.
+        started = self._trial_started_at
+        return started is not None and time.monotonic() - started < self.reset_timeout
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def available(self) -> bool:
+        """Cheap check for optional work (e.g. neural search) — no trial is consumed."""
+        return self.state != self.OPEN and not self._trial_in_flight
+
+    def before_call(self):
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.OPEN or self._trial_in_flight:
+            raise CircuitOpenError(f"{self.name} circuit open — failing fast")
+        self._trial_started_at = time.monotonic()  # half-open: this caller is the trial
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"{self.name} circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        was_trial = self._trial_started_at is not None
+        self._trial_started_at = None
+        if was_trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None or was_trial:
+                logger.warning(f"{self.name} circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """End a trial call that neither succeeded nor failed (e.g. cancelled)."""
+        self._trial_started_at = None
@@ -0,0 +1,141 @@
+"""
+Token-budgeted context packing for RAG prompts.
+
+Retrieved chunks are merged where they overlap (index_posts cuts sections
+into overlapping windows), then picked greedily by maximal marginal
+relevance: relevance to the query minus redundancy with what is already
+packed. Redundancy is word-set overlap plus a small same-post penalty, so a
+second relevant post beats a third near-copy of the first. Passages are
+capped at half the budget and trimmed at sentence boundaries, not mid-word.
+"""
+import re
+
+from .tokens import CHARS_PER_TOKEN, estimate_tokens
+
+MMR_LAMBDA = 0.7             # 1.0 = pure relevance, 0.0 = pure diversity
+SAME_POST_SIMILARITY = 0.3   # floor on redundancy between chunks of one post
+MIN_CHUNK_TOKENS = 25        # don't pack slivers
+MIN_MERGE_OVERLAP = 40       # chars of shared text that mark adjacent windows
+MAX_PASSAGE_SHARE = 0.5      # no single passage takes more than this share of the budget
+
+SECTION_RE = re.compile(r'^\[(?P<section>[^\]]*)\]\s*(?P<text>.*)$', re.S)
+SENTENCE_END_RE = re.compile(r'[.!?](?=\s)|\n')
+WORD_RE = re.compile(r'\w{3,}')
+
+
+def _split_section(content: str):
+    match = SECTION_RE.match(content.strip())
+    if match:
+        return match.group('section'), match.group('text').strip()
+    return '', content.strip()
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    longest = min(len(left), len(right))
+    for size in range(longest, MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_adjacent(chunks: list) -> list:
+    """Join overlapping windows of the same post section into one passage."""
+    merged = []
+    for chunk in chunks:
+        for other in merged:
+            if (other['post_id'], other['section']) != (chunk['post_id'], chunk['section']):
+                continue
+            if chunk['text'] in other['text']:
+                other['relevance'] = max(other['relevance'], chunk['relevance'])
+                break
+            if (size := _overlap(other['text'], chunk['text'])):
+                other['text'] += chunk['text'][size:]
+            elif (size := _overlap(chunk['text'], other['text'])):
+                other['text'] = chunk['text'] + other['text'][size:]
+            else:
+                continue
+            other['relevance'] = max(other['relevance'], chunk['relevance'])
+            break
+        else:
+            merged.append(dict(chunk))
+    return merged
+
+
+def _clean_start(text: str) -> str:
+    """Drop a leading sentence fragment left by the chunker's fixed-size windows."""
+    if text[:1].islower():
+        match = SENTENCE_END_RE.search(text)
+        if match and match.end() < len(text) // 3:
+            return text[match.end():].lstrip()
+    return text
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix within `max_tokens` that ends at a sentence boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    window = text[:max(0, (max_tokens - 1) * CHARS_PER_TOKEN)]
+    ends = [m.end() for m in SENTENCE_END_RE.finditer(window)]
+    return window[:ends[-1]].rstrip() if ends else ''
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(w.lower() for w in WORD_RE.findall(text))
+
+
+def _similarity(a: dict, b: dict) -> float:
+    union = len(a['words'] | b['words']) or 1
+    jaccard = len(a['words'] & b['words']) / union
+    return max(jaccard, SAME_POST_SIMILARITY) if a['post_id'] == b['post_id'] else jaccard
+
+
+def pack_context(candidates: list, budget_tokens: int, mmr_lambda: float = MMR_LAMBDA) -> str:
+    """
+    `candidates`: dicts with post_id, title, content ("[Section] text") and
+    relevance in [0, 1]. Returns markdown grouped by post, within the budget.
+    """
+    chunks = []
+    for c in candidates:
+        section, text = _split_section(c.get('content', ''))
+        if text:
+            chunks.append({
+                'post_id': c.get('post_id'), 'title': c.get('title') or 'Unknown',
+                'section': section, 'text': text, 'relevance': c.get('relevance', 0.0),
+            })
+    chunks = _merge_adjacent(chunks)
+    for chunk in chunks:
+        chunk['text'] = _clean_start(chunk['text'])
+        chunk['words'] = _words(chunk['text'])
+
+    selected, remaining = [], budget_tokens
+    packed_posts = set()
+    while chunks and remaining >= MIN_CHUNK_TOKENS:
+        def mmr(chunk):
+            redundancy = max((_similarity(chunk, s) for s in selected), default=0.0)
+            return mmr_lambda * chunk['relevance'] - (1 - mmr_lambda) * redundancy
+
+        best = max(chunks, key=mmr)
+        chunks.remove(best)
+        header = '' if best['post_id'] in packed_posts else f"### {best['title']}\n"
+        label = f"[{best['section']}] " if best['section'] else ''
+        available = min(remaining, int(budget_tokens * MAX_PASSAGE_SHARE)) - estimate_tokens(header + label)
+        text = trim_to_tokens(best['text'], available)
+        if estimate_tokens(text) < MIN_CHUNK_TOKENS:
+            continue
+        best['text'] = text
+        selected.append(best)
+        packed_posts.add(best['post_id'])
+        remaining -= estimate_tokens(header + label + text)
+
+    # Render grouped by post, posts and passages in selection order.
+    by_post = {}
+    for chunk in selected:
+        by_post.setdefault(chunk['post_id'], []).append(chunk)
+    blocks = []
+    for chunks_of_post in by_post.values():
+        passages = '\n\n'.join(
+            f"[{c['section']}] {c['text']}" if c['section'] else c['text'] for c in chunks_of_post
+        )
+        blocks.append(f"### {chunks_of_post[0]['title']}\n{passages}")
+    return '\n\n'.join(blocks)
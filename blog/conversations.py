@@ -0,0 +1,189 @@
+"""
+Server-side chat conversations.
+
+The widget sends only a conversation id and the new message. A conversation
+is two Redis keys with a sliding TTL: its turns as a list (one JSON entry per
+turn) and its rolling summary. Exchanges are appended with RPUSH, so replies
+from two tabs, or one landing while the conversation is being compacted,
+never overwrite each other.
+
+History is token-budgeted: recent turns are kept verbatim, and once they
+outgrow the budget the oldest ones are folded into the summary in the
+background. Only compaction removes turns — from the head, under a
+per-conversation lock (SET NX) — so the prefix it summarized is still the
+prefix it trims. Compaction frees half the budget at a time, so the prompt
+prefix stays stable between compactions and the model server can keep
+reusing its KV cache.
+"""
+import asyncio
+import json
+import logging
+import re
+import uuid
+
+from django.conf import settings
+
+from .redis_vectors import _decode, get_async_redis_client
+from .tokens import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+SUMMARY_TIMEOUT = 60  # seconds a compaction waits for the model
+COMPACT_LOCK_TTL = 2 * SUMMARY_TIMEOUT  # outlives any compaction, so two never overlap
+
+_background_tasks = set()
+
+
+def _turns_tokens(turns) -> int:
+    return sum(estimate_tokens(t['content']) for t in turns)
+
+
+def _turns_key(conversation_id: str) -> str:
+    return f"chat:conv:{conversation_id}:turns"
+
+
+def _summary_key(conversation_id: str) -> str:
+    return f"chat:conv:{conversation_id}:summary"
+
+
+def _lock_key(conversation_id: str) -> str:
+    return f"chat:conv:{conversation_id}:compacting"
+
+
+async def _read(conversation_id: str):
+    """(turns, summary) as of one point in time."""
+    pipe = get_async_redis_client().pipeline(transaction=True)
+    pipe.lrange(_turns_key(conversation_id), 0, -1)
+    pipe.get(_summary_key(conversation_id))
+    turns, summary = await pipe.execute()
+    return [json.loads(t) for t in turns], _decode(summary) or ''
+
+
+async def load_conversation(conversation_id: str | None, seed_history=None):
+    """
+    Returns (conversation_id, conversation). Unknown, expired or malformed ids
+    (or Redis being down) start a new conversation — seeded from
+    `seed_history` for clients that still send their own history.
+    """
+    if conversation_id and CONVERSATION_ID_RE.match(conversation_id):
+        try:
+            turns, summary = await _read(conversation_id)
+        except Exception as e:
+            logger.warning(f"Conversation {conversation_id} unavailable: {e}")
+        else:
+            if turns or summary:
+                return conversation_id, {'turns': turns, 'summary': summary, 'stored': True}
+    conversation = {'turns': list(seed_history or []), 'summary': '', 'stored': False}
+    return uuid.uuid4().hex, conversation
+
+
+def prompt_history(conversation: dict) -> list:
+    """The newest turns that fit the history token budget, in order."""
+    budget = settings.AI_HISTORY_TOKEN_BUDGET
+    kept, used = [], 0
+    for turn in reversed(conversation['turns']):
+        cost = estimate_tokens(turn['content'])
+        if used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    # Keep the user/assistant alternation: never start on an orphaned reply.
+    while kept and kept[0]['role'] != 'user':
+        kept.pop(0)
+    return kept
+
+
+async def append_turn(conversation_id: str, conversation: dict, user_msg: str, reply: str, client=None):
+    """
+    Append one exchange (after the seed history of a new conversation), then
+    compact in the background if the stored turns are over budget.
+    """
+    turns = [] if conversation['stored'] else conversation['turns']
+    turns = [*turns, {'role': 'user', 'content': user_msg}, {'role': 'assistant', 'content': reply}]
+    ttl = settings.AI_CONVERSATION_TTL
+    try:
+        pipe = get_async_redis_client().pipeline(transaction=True)
+        pipe.rpush(_turns_key(conversation_id), *(json.dumps(t) for t in turns))
+        pipe.expire(_turns_key(conversation_id), ttl)
+        pipe.expire(_summary_key(conversation_id), ttl)
+        pipe.lrange(_turns_key(conversation_id), 0, -1)
+        *_, stored = await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Conversation {conversation_id} not saved: {e}")
+        return
+    conversation['stored'] = True
+
+    if _turns_tokens(json.loads(t) for t in stored) > settings.AI_HISTORY_TOKEN_BUDGET:
+        task = asyncio.create_task(compact(conversation_id, client))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+def _extractive_summary(summary: str, turns) -> str:
+    """Fallback when the model is unavailable: keep what the user asked about."""
+    asked = [t['content'][:120].replace('\n', ' ') for t in turns if t['role'] == 'user']
+    lines = ([summary] if summary else []) + [f"- User asked: {q}" for q in asked]
+    return '\n'.join(lines)
+
+
+async def _summarize(summary: str, turns, client) -> str:
+    transcript = '\n'.join(f"{t['role'].title()}: {t['content'][:1500]}" for t in turns)
+    prompt = (
+        "Update the running summary of a chat between a user and a blog assistant. "
+        "Keep facts, names, links and open questions; drop pleasantries. "
+        "Answer with the summary only, at most 5 short bullet points.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    resp = await client.generate(model=None, prompt=prompt, options={'temperature': 0.1})
+    return resp['response'].strip()
+
+
+async def compact(conversation_id: str, client=None):
+    """Fold the oldest turns into the rolling summary until half the budget is free."""
+    r = get_async_redis_client()
+    lock, token = _lock_key(conversation_id), uuid.uuid4().hex
+    try:
+        if not await r.set(lock, token, nx=True, ex=COMPACT_LOCK_TTL):
+            return  # another request or worker is already compacting it
+    except Exception as e:
+        logger.warning(f"Conversation {conversation_id} not compacted: {e}")
+        return
+    try:
+        turns, summary = await _read(conversation_id)
+        target = settings.AI_HISTORY_TOKEN_BUDGET // 2
+        evict = 0
+        # Evict whole exchanges so the kept history still starts with a user turn.
+        while evict < len(turns) and _turns_tokens(turns[evict:]) > target:
+            evict += 2
+        evict = min(evict, len(turns))
+        if not evict:
+            return
+
+        evicted = turns[:evict]
+        try:
+            if client is None or not client.available:
+                raise RuntimeError('AI backend unavailable')
+            new_summary = await asyncio.wait_for(_summarize(summary, evicted, client), SUMMARY_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Conversation summary fell back to extractive: {e}")
+            new_summary = _extractive_summary(summary, evicted)
+        max_chars = settings.AI_SUMMARY_TOKEN_BUDGET * CHARS_PER_TOKEN
+        new_summary = new_summary[-max_chars:] if len(new_summary) > max_chars else new_summary
+
+        # Exchanges appended meanwhile went to the tail; the head is still `evicted`.
+        ttl = settings.AI_CONVERSATION_TTL
+        pipe = r.pipeline(transaction=True)
+        pipe.ltrim(_turns_key(conversation_id), evict, -1)
+        pipe.expire(_turns_key(conversation_id), ttl)
+        pipe.set(_summary_key(conversation_id), new_summary, ex=ttl)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Conversation {conversation_id} not compacted: {e}")
+    finally:
+        try:
+            if _decode(await r.get(lock)) == token:
+                await r.delete(lock)
+        except Exception:
+            pass  # expires on its own
@@ -0,0 +1,203 @@
+"""
+On-disk snapshots of the vector indexes.
+
+Re-embedding every chunk through the AI host takes minutes; restoring from a
+snapshot is local I/O. A snapshot is a directory:
+
+    manifest.json   format, embedding model, dimension, counts, post body hashes
+    chunks.npy      float32 matrix, one row per chunk (standard NumPy .npy v1.0)
+    chunks.jsonl    one line per row: doc id suffix, post_id, title, content
+    posts.npy       float32 matrix of post-level vectors
+    posts.jsonl     one line per row: post_id, title
+
+The .npy files are written and read with the standard library (NumPy can load
+them, but is not required). Import loads the chunks into a new index version
+with pipelined writes and switches the alias only after verification, like
+`index_posts --force`.
+"""
+import ast
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+
+from django.conf import settings
+
+from . import redis_vectors as rv
+
+SNAPSHOT_FORMAT = 1
+BATCH_SIZE = 500
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+class SnapshotError(Exception):
+    """The snapshot is missing, malformed or incompatible with this index."""
+
+
+# ─── .npy (float32, C order) ─────────────────────────────────────────────────
+
+def _write_npy(path: str, rows: list, dim: int):
+    header = f"{{'descr': '<f4', 'fortran_order': False, 'shape': ({len(rows)}, {dim}), }}"
+    # Pad so the data starts on a 64-byte boundary, as the format requires.
+    header += ' ' * (-(len(NPY_MAGIC) + 2 + len(header) + 1) % 64) + '\n'
+    with open(path, 'wb') as f:
+        f.write(NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1'))
+        for row in rows:
+            values = array('f', row)
+            if sys.byteorder == 'big':
+                values.byteswap()
+            f.write(values.tobytes())
+
+
+def _read_npy(path: str):
+    """Yield rows (lists of floats) from a float32 2-D .npy file."""
+    with open(path, 'rb') as f:
+        if f.read(len(NPY_MAGIC)) != NPY_MAGIC:
+            raise SnapshotError(f"{path}: not a version 1.0 .npy file")
+        (header_len,) = struct.unpack('<H', f.read(2))
+        header = ast.literal_eval(f.read(header_len).decode('latin1'))
+        if header.get('descr') != '<f4' or header.get('fortran_order') or len(header.get('shape', ())) != 2:
+            raise SnapshotError(f"{path}: expected a little-endian float32 matrix, got {header}")
+        count, dim = header['shape']
+        for _ in range(count):
+            values = array('f')
+            values.frombytes(f.read(dim * 4))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            yield values.tolist()
+
+
+def _write_jsonl(path: str, records: list):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def _read_jsonl(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+
+def _read_docs(client, keys: list) -> list:
+    docs = []
+    for start in range(0, len(keys), BATCH_SIZE):
+        pipe = client.pipeline(transaction=False)
+        for key in keys[start:start + BATCH_SIZE]:
+            pipe.json().get(key)
+        docs.extend(pipe.execute())
+    return docs
+
+
+def export_snapshot(directory: str) -> dict:
+    """Write the live chunk index, post vectors and post hashes to `directory`."""
+    client = rv.get_redis_client()
+    version = rv.get_live_version(client)
+    if version is None:
+        raise SnapshotError("No live vector index to export")
+    os.makedirs(directory, exist_ok=True)
+
+    prefix = rv.version_doc_prefix(version)
+    keys = sorted(rv._decode(k) for k in client.scan_iter(match=f"{prefix}*", count=BATCH_SIZE))
+    chunk_rows, chunk_meta = [], []
+    for key, doc in zip(keys, _read_docs(client, keys)):
+        if doc and len(doc.get('embedding') or ()) == rv.VECTOR_DIM:
+            chunk_rows.append(doc['embedding'])
+            chunk_meta.append({
+                'id': key[len(prefix):], 'post_id': doc['post_id'],
+                'title': doc.get('title', ''), 'content': doc.get('content', ''),
+            })
+
+    post_keys = sorted(rv._decode(k) for k in client.scan_iter(match=f"{rv.POST_DOC_PREFIX}*", count=BATCH_SIZE))
+    post_rows, post_meta = [], []
+    for doc in _read_docs(client, post_keys):
+        if doc and len(doc.get('embedding') or ()) == rv.VECTOR_DIM:
+            post_rows.append(doc['embedding'])
+            post_meta.append({'post_id': doc['post_id'], 'title': doc.get('title', '')})
+
+    hashes = {}
+    for meta in post_meta + chunk_meta:
+        if meta['post_id'] not in hashes:
+            hashes[meta['post_id']] = rv.get_post_hash(meta['post_id'])
+
+    _write_npy(os.path.join(directory, 'chunks.npy'), chunk_rows, rv.VECTOR_DIM)
+    _write_jsonl(os.path.join(directory, 'chunks.jsonl'), chunk_meta)
+    _write_npy(os.path.join(directory, 'posts.npy'), post_rows, rv.VECTOR_DIM)
+    _write_jsonl(os.path.join(directory, 'posts.jsonl'), post_meta)
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'created_at': time.time(),
+        'embedding_model': settings.AI_EMBEDDING_MODEL,
+        'dim': rv.VECTOR_DIM,
+        'chunks': len(chunk_rows),
+        'posts': len(post_rows),
+        'post_hashes': {str(pid): h for pid, h in hashes.items() if h},
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ─── Import ──────────────────────────────────────────────────────────────────
+
+def read_manifest(directory: str, ignore_model: bool = False) -> dict:
+    path = os.path.join(directory, 'manifest.json')
+    if not os.path.exists(path):
+        raise SnapshotError(f"No snapshot at {directory}")
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')}")
+    if manifest.get('dim') != rv.VECTOR_DIM:
+        raise SnapshotError(f"Snapshot vectors have {manifest.get('dim')} dimensions, index expects {rv.VECTOR_DIM}")
+    if manifest.get('embedding_model') != settings.AI_EMBEDDING_MODEL and not ignore_model:
+        raise SnapshotError(
+            f"Snapshot was embedded with {manifest.get('embedding_model')}, "
+            f"queries use {settings.AI_EMBEDDING_MODEL}"
+        )
+    return manifest
+
+
+def _load_rows(client, directory: str, name: str, key_for, doc_for) -> int:
+    """Pipeline JSON.SETs for one matrix + sidecar pair. Returns the number of documents written."""
+    vectors = _read_npy(os.path.join(directory, f'{name}.npy'))
+    written = 0
+    pipe = client.pipeline(transaction=False)
+    for meta in _read_jsonl(os.path.join(directory, f'{name}.jsonl')):
+        embedding = next(vectors, None)
+        if embedding is None:
+            raise SnapshotError(f"{name}.npy has fewer rows than {name}.jsonl")
+        pipe.json().set(key_for(meta), '$', {**doc_for(meta), 'embedding': embedding})
+        written += 1
+        if written % BATCH_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+    return written
+
+
+def load_chunks(directory: str, version: int, client) -> int:
+    """Write the snapshot's chunks into index `version`."""
+    prefix = rv.version_doc_prefix(version)
+    return _load_rows(
+        client, directory, 'chunks',
+        key_for=lambda m: f"{prefix}{m['id']}",
+        doc_for=lambda m: {'post_id': m['post_id'], 'title': m['title'], 'content': m['content']},
+    )
+
+
+def load_posts(directory: str, client, manifest: dict) -> int:
+    """Write the snapshot's post vectors and post body hashes."""
+    rv.ensure_post_index_exists()
+    written = _load_rows(
+        client, directory, 'posts',
+        key_for=lambda m: rv.post_vector_key(m['post_id']),
+        doc_for=lambda m: {'post_id': m['post_id'], 'title': m['title']},
+    )
+    for post_id, content_hash in manifest.get('post_hashes', {}).items():
+        rv.set_post_hash(int(post_id), content_hash)
+    return written
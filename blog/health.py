@@ -0,0 +1,172 @@
+"""
+Background-probed health status.
+
+One prober per deployment — whichever worker holds the Redis lock — checks
+the AI host, Redis (and the vector index) and Postgres every
+HEALTH_PROBE_INTERVAL seconds and publishes a JSON snapshot to Redis.
+`/api/chat/status/` reads that snapshot instead of probing on every request;
+each worker also memoises it for a second, so most reads never leave the
+process.
+
+Readiness is the exception: the snapshot says the deployment can reach
+Postgres, not that this worker can, so `/health/ready/` checks the worker's
+own connection (memoised for READY_TTL seconds).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "health:snapshot"
+LOCK_KEY = "health:prober"
+LOCAL_TTL = 1.0  # seconds a worker reuses the snapshot it last read
+READY_TTL = 5.0  # seconds a worker reuses its own readiness check
+AI_PROBE_TIMEOUT = 2.0
+
+# Readiness needs what every page needs; the AI host is optional (chat degrades).
+REQUIRED_CHECKS = ('database',)
+
+_local = {'snapshot': None, 'read_at': 0.0}
+_readiness = {'result': None, 'checked_at': 0.0}
+_prober_started = False
+
+
+def _timed(check) -> dict:
+    started = time.perf_counter()
+    try:
+        result = check() or {}
+        result['ok'] = result.get('ok', True)
+    except Exception as e:
+        result = {'ok': False, 'error': str(e)[:200]}
+    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def probe_database() -> dict:
+    def check():
+        try:
+            with connections['default'].cursor() as cursor:
+                cursor.execute("SELECT 1")
+        finally:
+            close_old_connections()
+    return _timed(check)
+
+
+def probe_redis() -> dict:
+    from .redis_vectors import INDEX_NAME, get_redis_client
+
+    def check():
+        client = get_redis_client()
+        client.ping()
+        try:
+            client.ft(INDEX_NAME).info()
+            return {'index': True}
+        except Exception:
+            return {'index': False}  # Redis is up; RAG just has nothing to search yet
+    return _timed(check)
+
+
+def probe_ai() -> dict:
+    import httpx
+
+    def check():
+        host = settings.AI_HOST
+        base_url = host if host.endswith('/v1') else f"{host.rstrip('/')}/v1"
+        response = httpx.get(
+            f"{base_url}/models",
+            headers={"Authorization": f"Bearer {settings.AI_API_KEY}"},
+            timeout=AI_PROBE_TIMEOUT,
+        )
+        response.raise_for_status()
+    return _timed(check)
+
+
+def run_probes() -> dict:
+    return {
+        'checked_at': time.time(),
+        'database': probe_database(),
+        'redis': probe_redis(),
+        'ai': probe_ai(),
+    }
+
+
+def publish_snapshot(snapshot: dict):
+    from .redis_vectors import get_redis_client
+    ttl = max(1, int(settings.HEALTH_PROBE_INTERVAL * 3))
+    get_redis_client().set(SNAPSHOT_KEY, json.dumps(snapshot), ex=ttl)
+
+
+async def get_snapshot():
+    """Latest published snapshot, or None when none is fresh (prober down, Redis down)."""
+    now = time.monotonic()
+    if _local['snapshot'] is not None and now - _local['read_at'] < LOCAL_TTL:
+        return _local['snapshot']
+
+    from .redis_vectors import get_async_redis_client
+    try:
+        raw = await get_async_redis_client().get(SNAPSHOT_KEY)
+    except Exception as e:
+        logger.warning(f"Health snapshot unavailable: {e}")
+        raw = None
+    snapshot = json.loads(raw) if raw else None
+    _local.update(snapshot=snapshot, read_at=now)
+    return snapshot
+
+
+def is_ready(snapshot: dict) -> bool:
+    return all(snapshot.get(name, {}).get('ok') for name in REQUIRED_CHECKS)
+
+
+async def local_readiness() -> dict:
+    """This worker's own REQUIRED_CHECKS, run at most once per READY_TTL."""
+    from asgiref.sync import sync_to_async
+
+    now = time.monotonic()
+    if _readiness['result'] is not None and now - _readiness['checked_at'] < READY_TTL:
+        return _readiness['result']
+    # Thread-sensitive: the same connection the worker's async ORM calls use.
+    result = {'checked_at': time.time(), 'database': await sync_to_async(probe_database)()}
+    _readiness.update(result=result, checked_at=now)
+    return result
+
+
+# ─── Prober ───────────────────────────────────────────────────────────────────
+
+def _acquire_lock(client, owner: str, ttl: int) -> bool:
+    """Take or renew the prober lock. Only one worker in the deployment holds it."""
+    if client.set(LOCK_KEY, owner, nx=True, ex=ttl):
+        return True
+    if client.get(LOCK_KEY) == owner.encode():
+        client.expire(LOCK_KEY, ttl)
+        return True
+    return False
+
+
+def _prober_loop():
+    from .redis_vectors import get_redis_client
+
+    interval = settings.HEALTH_PROBE_INTERVAL
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        try:
+            if _acquire_lock(get_redis_client(), owner, ttl=max(1, int(interval * 2))):
+                publish_snapshot(run_probes())
+        except Exception as e:
+            logger.warning(f"Health prober error: {e}")
+        time.sleep(interval)
+
+
+def start_health_prober():
+    """Start the background prober thread (once per process)."""
+    global _prober_started
+    if _prober_started or not settings.HEALTH_PROBER_ENABLED:
+        return
+    _prober_started = True
+    threading.Thread(target=_prober_loop, name='health-prober', daemon=True).start()
@@ -0,0 +1,117 @@
+"""
+Responsive image derivatives for Post.image.
+
+After upload, the original is resized to a few widths and re-encoded as WebP
+(and AVIF when enabled and supported). Derivative names embed a digest of the
+original so /media/ can serve them as immutable. Results are stored on the post
+with a queryset update() — no save signals, no reindexing.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 960, 1280)
+WEBP_QUALITY = 80
+AVIF_QUALITY = 55
+DIGEST_LENGTH = 10
+# Exactly what _variant_name produces (plus the suffix storage adds on a name clash).
+VARIANT_NAME_RE = re.compile(r'\.[0-9a-f]{%d}\.w\d+(_[A-Za-z0-9]{7})?\.(webp|avif)$' % DIGEST_LENGTH)
+
+
+def avif_supported() -> bool:
+    from PIL import Image
+    try:
+        import pillow_avif  # noqa: F401 — registers the AVIF plugin on older Pillow
+    except ImportError:
+        pass
+    Image.init()
+    return 'AVIF' in Image.SAVE
+
+
+def needs_variants(post) -> bool:
+    """True when the post has an image whose derivatives are missing or stale."""
+    if not post.image:
+        return False
+    return (post.image_variants or {}).get('source') != post.image.name
+
+
+def _variant_name(source_name: str, digest: str, width: int, fmt: str) -> str:
+    stem, _ = os.path.splitext(source_name)
+    return f"{stem}.{digest}.w{width}.{fmt}"
+
+
+def build_variants(source_name: str, data: bytes) -> dict:
+    """Encode derivatives for one original and return the image_variants payload."""
+    from PIL import Image, ImageOps
+
+    digest = hashlib.sha1(data).hexdigest()[:DIGEST_LENGTH]
+    formats = ['webp']
+    if settings.IMAGE_AVIF_ENABLED and avif_supported():
+        formats.append('avif')
+
+    with Image.open(io.BytesIO(data)) as original:
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() or img.mode == 'P' else 'RGB')
+        width, height = img.size
+
+        # Never upscale; always include one derivative at (capped) native width.
+        widths = sorted({w for w in VARIANT_WIDTHS if w < width} | {min(width, VARIANT_WIDTHS[-1])})
+        variants = {fmt: [] for fmt in formats}
+        # Downscale from the largest target first so each step resizes a smaller image.
+        current = img
+        for w in reversed(widths):
+            h = max(1, round(height * w / width))
+            if current.size != (w, h):
+                current = current.resize((w, h), Image.LANCZOS)
+            for fmt in formats:
+                buf = io.BytesIO()
+                if fmt == 'webp':
+                    current.save(buf, 'WEBP', quality=WEBP_QUALITY, method=4)
+                else:
+                    current.save(buf, 'AVIF', quality=AVIF_QUALITY)
+                name = _variant_name(source_name, digest, w, fmt)
+                if not default_storage.exists(name):
+                    name = default_storage.save(name, ContentFile(buf.getvalue()))
+                variants[fmt].append({'width': w, 'name': name})
+
+    for entries in variants.values():
+        entries.sort(key=lambda e: e['width'])
+    return {'source': source_name, 'width': width, 'height': height, **variants}
+
+
+def generate_post_variants(post_id: int, force: bool = False) -> bool:
+    """Build and store derivatives for one post. Returns True when work was done."""
+    from blog.models import Post
+    from blog.page_cache import bump_global_generation
+
+    post = Post.objects.only('id', 'image', 'image_variants').get(pk=post_id)
+    if not post.image or not (force or needs_variants(post)):
+        return False
+
+    with post.image.open('rb') as f:
+        data = f.read()
+    payload = build_variants(post.image.name, data)
+    Post.objects.filter(pk=post_id).update(
+        image_width=payload['width'],
+        image_height=payload['height'],
+        image_variants=payload,
+    )
+    bump_global_generation()  # cached pages still carry the old <img> markup
+    return True
+
+
+def run_image_variants(post_id: int):
+    """Background entry point used by the post_save signal."""
+    try:
+        generate_post_variants(post_id)
+    except Exception as e:
+        logger.error(f"Image variant generation failed for post {post_id}: {e}")
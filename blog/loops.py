@@ -0,0 +1,64 @@
+"""
+Per-event-loop resources.
+
+Pooled async clients (httpx, redis.asyncio) belong to the loop that opened
+them. Besides the worker's long-lived loop, async_to_sync in signal and
+command threads, asyncio.run and asyncio.Runner all spin up short-lived
+ones, so nothing pooled may be shared across loops: each running loop gets
+its own client from `for_running_loop`.
+
+Clients given a `close` coroutine function are closed when their loop shuts
+down: a suspended async generator is parked on the loop, and the
+`loop.shutdown_asyncgens()` that asyncio.run, asyncio.Runner and
+async_to_sync all call on exit runs its `finally`.
+"""
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_shutdown_hooks = {}  # (registry id, loop) → async generator; the loop only keeps weak references
+
+
+async def _close_on_shutdown(registry: dict, loop, value, close):
+    try:
+        yield
+    finally:
+        with _lock:
+            if registry.get(loop) is value:
+                del registry[loop]
+            _shutdown_hooks.pop((id(registry), loop), None)
+        try:
+            await close(value)
+        except Exception as e:
+            logger.warning(f"Closing {type(value).__name__} on loop shutdown failed: {e}")
+
+
+def _park_until_shutdown(hook):
+    """Advance `hook` to its yield right away; the running loop now tracks it for shutdown_asyncgens()."""
+    try:
+        hook.__anext__().send(None)
+    except StopIteration:
+        pass
+
+
+def for_running_loop(registry: dict, factory, close=None):
+    """
+    registry[running event loop], created by `factory()` on first use and,
+    with `close`, closed by `await close(value)` when that loop shuts down.
+    Entries of loops closed without shutting down are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        value = registry.get(loop)
+        if value is None:
+            for stale in [other for other in registry if other.is_closed()]:
+                del registry[stale]
+                _shutdown_hooks.pop((id(registry), stale), None)
+            value = registry[loop] = factory()
+            if close is not None:
+                hook = _shutdown_hooks[(id(registry), loop)] = _close_on_shutdown(registry, loop, value, close)
+                _park_until_shutdown(hook)
+    return value
@@ -0,0 +1,313 @@
+import datetime
+import random
+import threading
+import time
+import warnings
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.benchmarking import QUERY_BUDGETS, FakeAIClient, FakeVectorBackend, cold_cache, percentile
+
+WORDS = (
+    'python', 'django', 'redis', 'async', 'cache', 'vector', 'kubernetes', 'postgres',
+    'latency', 'streaming', 'markdown', 'search', 'index', 'docker', 'queue', 'embedding',
+    'profiling', 'nginx', 'worker', 'sitemap', 'database', 'memory', 'thread', 'socket',
+)
+
+class QueryCounter:
+    """Counts SQL statements from every thread: templates render off the event loop."""
+
+    def __init__(self):
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        from django.db.backends.utils import CursorWrapper
+
+        original = CursorWrapper.execute
+        counter = self
+
+        def execute(cursor, sql, params=None):
+            with counter._lock:
+                counter.statements.append(sql)
+            return original(cursor, sql, params)
+
+        self._patcher = mock.patch.object(CursorWrapper, 'execute', execute)
+        self._patcher.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._patcher.stop()
+
+    def take(self) -> list:
+        with self._lock:
+            statements, self.statements = self.statements, []
+        return statements
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the main views against a seeded synthetic corpus in the test database, '
+        'with fake AI and vector backends and a local-memory cache. Reports p50/p95/p99 per '
+        'view and fails when a view runs more SQL queries than its budget. Needs PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000, help='Posts in the synthetic corpus')
+        parser.add_argument('--tags', type=int, default=150, help='Distinct tags')
+        parser.add_argument('--deep-comments', type=int, default=400,
+                            help='Comments on the deep-thread post')
+        parser.add_argument('--thread-depth', type=int, default=12, help='Reply depth on the deep-thread post')
+        parser.add_argument('--iterations', type=int, default=20, help='Measured requests per view and cache state')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per view first')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the corpus')
+        parser.add_argument('--reseed', action='store_true', help='Rebuild the corpus even if it matches')
+        parser.add_argument('--max-p95', type=float, default=None,
+                            help='Also fail when any cold p95 exceeds this many ms')
+        parser.add_argument('--show-sql', action='store_true', help='Print the statements of views over budget')
+
+    def handle(self, *args, **options):
+        from django.db import connection, connections
+        from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('The views use trigram search; run the benchmark against PostgreSQL')
+
+        setup_test_environment()
+        # Kept between runs: seeding thousands of posts is the slow part.
+        old_name = connection.creation.create_test_db(verbosity=0, keepdb=True, serialize=False)
+        try:
+            with override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                    'LOCATION': 'benchmark-views'}},
+                HEALTH_PROBER_ENABLED=False,
+            ):
+                corpus = self.corpus(options)
+                results = self.run_scenarios(corpus, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=True)
+            teardown_test_environment()
+
+        self.report(results, options)
+
+    # ─── Corpus ──────────────────────────────────────────────────────────────
+
+    def corpus(self, options) -> dict:
+        from blog.models import Post
+
+        if options['reseed'] or Post.objects.count() != options['posts']:
+            started = time.perf_counter()
+            self.seed(random.Random(options['seed']), options)
+            self.stdout.write(f"Seeded {options['posts']} posts in {time.perf_counter() - started:.1f}s")
+        else:
+            self.stdout.write(f"Reusing the {options['posts']}-post corpus in the test database")
+        return self.pick_targets()
+
+    def seed(self, rng, options):
+        from django.contrib.auth.models import User
+        from django.contrib.contenttypes.models import ContentType
+        from django.db import transaction
+        from django.utils import timezone
+        from django.utils.text import slugify
+        from taggit.models import Tag, TaggedItem
+        from blog.models import Comment, Post
+
+        with transaction.atomic():
+            Comment.objects.all().delete()
+            TaggedItem.objects.all().delete()
+            Post.objects.all().delete()
+            Tag.objects.all().delete()
+            author, _ = User.objects.get_or_create(username='benchmark')
+
+            tags = Tag.objects.bulk_create([
+                Tag(name=f"{WORDS[i % len(WORDS)]} {i // len(WORDS) + 1}",
+                    slug=f"{WORDS[i % len(WORDS)]}-{i // len(WORDS) + 1}")
+                for i in range(options['tags'])
+            ])
+            tag_weights = [1 / (i + 1) for i in range(len(tags))]  # a few tags are very common
+
+            now = timezone.now()
+            posts = []
+            for i in range(options['posts']):
+                title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))).capitalize()
+                posts.append(Post(
+                    title=f"{title} {i}",
+                    slug=slugify(f"{title} {i}"),
+                    author=author,
+                    body=self.markdown_body(rng),
+                    publish=now - datetime.timedelta(minutes=rng.randint(1, 3 * 365 * 24 * 60)),
+                    status='draft' if rng.random() < 0.05 else 'published',
+                ))
+            posts = Post.objects.bulk_create(posts, batch_size=500)
+
+            post_type = ContentType.objects.get_for_model(Post)
+            TaggedItem.objects.bulk_create([
+                TaggedItem(content_type=post_type, object_id=post.id, tag=tag)
+                for post in posts
+                for tag in set(rng.choices(tags, weights=tag_weights, k=rng.randint(1, 5)))
+            ], batch_size=2000)
+
+            published = [p for p in posts if p.status == 'published']
+            # Ordinary posts: a few comments, some with replies.
+            roots = self.comments(rng, [(p, None) for p in published for _ in range(rng.randint(0, 4))])
+            self.comments(rng, [(c.post, c) for c in roots if rng.random() < 0.4])
+
+            # One post with a large, deeply nested thread.
+            deep = published[0]
+            layer = self.comments(rng, [(deep, None)] * 10)
+            total = len(layer)
+            for _ in range(options['thread_depth']):
+                budget = options['deep_comments'] - total
+                if budget <= 0:
+                    break
+                wanted = [(deep, parent) for parent in layer for _ in range(rng.choice((1, 1, 2)))]
+                layer = self.comments(rng, wanted[:budget])
+                total += len(layer)
+
+    def comments(self, rng, targets) -> list:
+        from blog.models import Comment
+
+        return Comment.objects.bulk_create([
+            Comment(
+                post=post, parent=parent,
+                name=rng.choice(WORDS).title(), email=f"{rng.choice(WORDS)}@example.com",
+                body=' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))),
+            )
+            for post, parent in targets
+        ], batch_size=1000)
+
+    def markdown_body(self, rng) -> str:
+        sections = []
+        for _ in range(rng.randint(3, 6)):
+            heading = ' '.join(rng.choice(WORDS) for _ in range(3)).title()
+            paragraphs = [
+                ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) + '.'
+                for _ in range(rng.randint(1, 3))
+            ]
+            bullets = '\n'.join(f"- `{rng.choice(WORDS)}` {rng.choice(WORDS)}" for _ in range(rng.randint(0, 4)))
+            code = f"```python\ndef {rng.choice(WORDS)}():\n    return {rng.randint(0, 999)}\n```"
+            sections.append(f"## {heading}\n\n" + '\n\n'.join(paragraphs) + f"\n\n{bullets}\n\n{code}")
+        return '\n\n'.join(sections)
+
+    def pick_targets(self) -> dict:
+        from django.db.models import Count
+        from taggit.models import Tag
+        from blog.models import Post
+
+        deep = Post.published.annotate(n=Count('comments')).order_by('-n').first()
+        typical = Post.published.annotate(n=Count('comments')).filter(n__gt=0).order_by('n', '-publish').first()
+        tag = Tag.objects.filter(post__status='published').annotate(n=Count('post')).order_by('-n').first()
+        if deep is None or typical is None or tag is None:
+            raise CommandError('The corpus is empty — rerun with --reseed')
+        return {
+            'deep': deep, 'typical': typical, 'tag': tag,
+            'post_ids': list(Post.published.values_list('id', flat=True)),
+            'pages': -(-Post.published.count() // 10),
+        }
+
+    # ─── Measurement ─────────────────────────────────────────────────────────
+
+    def scenarios(self, corpus) -> list:
+        from django.urls import reverse
+
+        return [
+            ('post_list', reverse('blog:post_list')),
+            ('post_list_page', reverse('blog:post_list') + f"?page={corpus['pages'] // 2}"),
+            ('post_list_tag', reverse('blog:post_tag', args=[corpus['tag'].slug])),
+            ('post_list_search', reverse('blog:post_list') + '?q=redis+cache'),
+            ('post_detail', corpus['typical'].get_absolute_url()),
+            ('post_detail_deep', corpus['deep'].get_absolute_url()),
+            ('search_live', reverse('blog:search_live') + '?q=python'),
+            # No title matches: exercises the embedding + vector fallback.
+            ('search_live_neural', reverse('blog:search_live') + '?q=qzxv+wkpf'),
+            ('sitemap_index', reverse('sitemap_index')),
+            ('sitemap_section', reverse('sitemap_section', kwargs={'section': 'posts'})),
+        ]
+
+    def run_scenarios(self, corpus, options) -> list:
+        from django.test import Client
+
+        vectors = FakeVectorBackend(corpus['post_ids'])
+
+        async def allow(policy, request):
+            return 0
+
+        async def no_log(kind, text):
+            pass
+
+        client = Client()
+        results = []
+        with mock.patch('blog.views.get_ai_client', return_value=FakeAIClient()), \
+                mock.patch('blog.views.get_cached_embedding_async', vectors.get_cached_embedding), \
+                mock.patch('blog.views.cache_embedding_async', vectors.cache_embedding), \
+                mock.patch('blog.views.search_posts_async', vectors.search_posts), \
+                mock.patch('blog.views.log_query', no_log), \
+                mock.patch('blog.ratelimit.acheck_rate_limit', allow), \
+                QueryCounter() as counter:
+            for name, path in self.scenarios(corpus):
+                cold_budget, warm_budget = QUERY_BUDGETS[name]
+                for _ in range(options['warmup']):
+                    cold_cache()
+                    self.request(client, path)
+                result = {'name': name, 'path': path}
+                states = [('cold', cold_budget)] + ([('warm', warm_budget)] if warm_budget is not None else [])
+                for state, budget in states:
+                    timings, worst = [], []
+                    for _ in range(options['iterations']):
+                        if state == 'cold':
+                            cold_cache()
+                        else:
+                            self.request(client, path)  # make sure the page is cached
+                        counter.take()
+                        timings.append(self.request(client, path))
+                        statements = counter.take()
+                        if len(statements) >= len(worst):
+                            worst = statements
+                    result[state] = {
+                        'p50': percentile(timings, 50), 'p95': percentile(timings, 95),
+                        'p99': percentile(timings, 99), 'queries': len(worst),
+                        'budget': budget, 'statements': worst,
+                    }
+                results.append(result)
+        return results
+
+    def request(self, client, path) -> float:
+        started = time.perf_counter()
+        response = client.get(path, secure=True)
+        if response.streaming:
+            with warnings.catch_warnings():
+                # Under ASGI the sitemap streams asynchronously; the test client drains it here.
+                warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume asynchronous')
+                b''.join(response)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise CommandError(f"{path} returned HTTP {response.status_code}")
+        return elapsed
+
+    # ─── Report ──────────────────────────────────────────────────────────────
+
+    def report(self, results, options):
+        self.stdout.write(f"\n{'view':<20} {'cache':<5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL':>4} {'budget':>6}")
+        failures = []
+        for result in results:
+            for state in ('cold', 'warm'):
+                stats = result.get(state)
+                if stats is None:
+                    continue
+                over = stats['queries'] > stats['budget']
+                line = (f"{result['name']:<20} {state:<5} {stats['p50']:8.1f} {stats['p95']:8.1f} "
+                        f"{stats['p99']:8.1f} {stats['queries']:4d} {stats['budget']:6d}")
+                self.stdout.write(self.style.ERROR(line) if over else line)
+                if over:
+                    failures.append(f"{result['name']} ({state}) ran {stats['queries']} queries, budget {stats['budget']}")
+                    if options['show_sql']:
+                        for sql in stats['statements']:
+                            self.stdout.write(f"    {sql[:200]}")
+                if state == 'cold' and options['max_p95'] is not None and stats['p95'] > options['max_p95']:
+                    failures.append(f"{result['name']} cold p95 {stats['p95']:.1f}ms > {options['max_p95']:.0f}ms")
+
+        if failures:
+            raise CommandError("View benchmark failed — " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("✓ All views within their query budgets"))
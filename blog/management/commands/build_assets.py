@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Bundle site CSS/JS into static/bundle/ (run before collectstatic, which hashes and compresses them)'
+
+    def handle(self, *args, **options):
+        from blog.assets import write_bundles
+
+        for path, size in write_bundles().items():
+            self.stdout.write(self.style.SUCCESS(f"✓ {path} ({size / 1024:.1f} KiB)"))
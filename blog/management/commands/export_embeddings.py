@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Export the live vector index (chunks, post vectors, post hashes) to a snapshot directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Snapshot directory (created if missing)')
+
+    def handle(self, *args, **options):
+        from blog.embedding_snapshot import SnapshotError, export_snapshot
+
+        try:
+            manifest = export_snapshot(options['output'])
+        except SnapshotError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Exported {manifest['chunks']} chunks and {manifest['posts']} post vectors "
+            f"({manifest['embedding_model']}) to {options['output']}"
+        ))
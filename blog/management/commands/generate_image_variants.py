@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Backfill responsive WebP/AVIF derivatives and dimensions for post images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild derivatives even if they are current')
+
+    def handle(self, *args, **options):
+        from blog.models import Post
+        from blog.images import generate_post_variants
+
+        force = options.get('force')
+        ids = Post.objects.exclude(image='').exclude(image__isnull=True).values_list('id', flat=True)
+        built = 0
+        for post_id in ids:
+            try:
+                if generate_post_variants(post_id, force=force):
+                    built += 1
+                    self.stdout.write(self.style.SUCCESS(f"✓ post {post_id}"))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"✗ post {post_id}: {e}"))
+        self.stdout.write(f"Image variants built for {built} post(s).")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Restore the vector index from an export_embeddings snapshot without calling the AI host'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Snapshot directory')
+        parser.add_argument('--if-empty', action='store_true',
+                            help='Only restore when there is no live index or it has no documents')
+        parser.add_argument('--ignore-model', action='store_true',
+                            help='Load even if the snapshot was embedded with a different model')
+
+    def handle(self, *args, **options):
+        from blog.embedding_snapshot import SnapshotError, load_chunks, load_posts, read_manifest
+        from blog.redis_vectors import (
+            BUILD_LOCK_KEY, create_index_version, garbage_collect_index_versions, get_chunk_count,
+            get_live_version, get_redis_client, index_version_name, promote_index_version,
+            wait_until_indexed,
+        )
+
+        directory = options['input']
+        try:
+            manifest = read_manifest(directory, ignore_model=options.get('ignore_model'))
+        except SnapshotError as e:
+            raise CommandError(str(e))
+
+        redis_client = get_redis_client()
+        if options.get('if_empty') and get_live_version(redis_client) is not None and get_chunk_count():
+            self.stdout.write("Live index already populated — snapshot not loaded.")
+            return
+
+        if not redis_client.set(BUILD_LOCK_KEY, 1, nx=True, ex=3600):
+            raise CommandError("An index rebuild is running")
+        try:
+            version = create_index_version(redis_client)
+            try:
+                loaded = load_chunks(directory, version, redis_client)
+            except SnapshotError as e:
+                redis_client.ft(index_version_name(version)).dropindex(delete_documents=True)
+                raise CommandError(f"{e} — version {version} discarded, live index unchanged")
+
+            stats = wait_until_indexed(version, client=redis_client)
+            if stats['failures'] or stats['num_docs'] != loaded:
+                redis_client.ft(index_version_name(version)).dropindex(delete_documents=True)
+                raise CommandError(
+                    f"Verification failed for version {version}: {stats['num_docs']}/{loaded} docs, "
+                    f"{stats['failures']} failures — discarded, live index unchanged"
+                )
+            promote_index_version(version, redis_client)
+            posts = load_posts(directory, redis_client, manifest)
+            garbage_collect_index_versions(version, redis_client)
+        finally:
+            redis_client.delete(BUILD_LOCK_KEY)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Restored {loaded} chunks and {posts} post vectors into index version {version}"
+        ))
+        self.stdout.write("Run index_posts to re-embed posts changed since the snapshot was taken.")
@@ -1,4 +1,5 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+import asyncio
 import re
 import hashlib
 
@@ -6,75 +7,164 @@ class Command(BaseCommand):
     help = 'Index blog posts into Redis vector database with Section-Awareness'
 
     def add_arguments(self, parser):
-        parser.add_argument('--force', action='store_true', help='Force re-index')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rebuild everything into a new index version and switch to it when verified',
+        )
 
     def handle(self, *args, **options):
-        from blog.models import Post
-        from blog.redis_vectors import index_chunk, delete_post_chunks, ensure_index_exists, get_post_hash, set_post_hash
-        from blog.ai_utils import get_ai_client
-        from asgiref.sync import async_to_sync
+        from blog.ai_utils import new_ai_client
+
+        # One private event loop and AI transport for the whole run: connections
+        # are reused across chunks and never shared with the worker's loop
+        # (signals run this command in a thread inside the ASGI worker).
+        with asyncio.Runner() as runner:
+            self.run_async = runner.run
+            self.client = new_ai_client()
+            try:
+                self.index(options)
+            finally:
+                runner.run(self.client.aclose())
+
+    def index(self, options):
+        from blog.redis_vectors import ensure_index_exists
+
+        if options.get('force'):
+            self.rebuild()
+            return
 
         self.stdout.write("Building Neural Index (Section-Aware Mode)...")
         ensure_index_exists()
-        client = get_ai_client()
-        force = options.get('force')
-        
+        self.update_live()
+
+    def update_live(self):
+        """Incremental: re-index changed posts in place in the live index version."""
+        from blog.models import Post
+        from blog.redis_vectors import (
+            delete_post_chunks, get_live_version, get_post_hash, has_post_vector, set_post_hash,
+        )
+
+        version = get_live_version()
         for post in Post.published.all():
             try:
                 # 1. Check if content has changed
                 current_hash = hashlib.md5(post.body.encode()).hexdigest()
-                if not force and get_post_hash(post.id) == current_hash:
+                if get_post_hash(post.id) == current_hash:
+                    if not has_post_vector(post.id):
+                        self.index_post_vector(post)
                     continue
-                
-                # 1. Generate Semantic Summary if missing
-                if not post.semantic_summary or force:
-                    self.stdout.write(f"  ...generating semantic summary for '{post.title}'")
-                    summary_prompt = f"Summarize the technical core of this post in 3 sentences for an AI knowledge base:\n\n{re.sub('<[^<]+?>', '', post.body)[:3000]}"
-                    summary_resp = async_to_sync(client.generate)(model=None, prompt=summary_prompt)
-                    post.semantic_summary = summary_resp['response'].strip()
-                    post.save()
-
-                delete_post_chunks(post.id)
-                
-                # 2. Section Extraction (H2, H3 tags)
-                sections = re.split(r'<(h[1-4])[^>]*>(.*?)</\1>', post.body, flags=re.IGNORECASE)
-                parts = []
-                current_header = "Introduction"
-                intro_text = sections[0].strip()
-                if intro_text:
-                    parts.append((current_header, intro_text))
-                
-                for i in range(1, len(sections), 3):
-                    tag = sections[i]
-                    header = sections[i+1]
-                    content = sections[i+2] if i+2 < len(sections) else ""
-                    parts.append((header, content))
-
-                CHUNK_SIZE = 1200
-                CHUNK_OVERLAP = 200
-
-                for section_title, html_content in parts:
-                    clean_text = re.sub('<[^<]+?>', '', html_content).strip()
-                    if len(clean_text) < 50: continue
-                    
-                    # Split long sections into chunks with overlap
-                    for i in range(0, len(clean_text), CHUNK_SIZE - CHUNK_OVERLAP):
-                        chunk_text = clean_text[i:i + CHUNK_SIZE]
-                        if len(chunk_text) < 100: continue
-                        
-                        # Prepend section metadata
-                        rich_context = f"Post: {post.title} | Section: {section_title}\n{chunk_text}"
-                        emb_resp = async_to_sync(client.embeddings)(model=None, prompt=rich_context)
-                        emb = emb_resp['embedding']
-                        
-                        index_chunk(
-                            post_id=post.id,
-                            title=post.title,
-                            content=f"[{section_title}] {chunk_text}",
-                            embedding=emb
-                        )
-                
+                delete_post_chunks(post.id, version=version)
+                self.index_post(post, version)
+                self.index_post_vector(post)
                 set_post_hash(post.id, current_hash)
                 self.stdout.write(self.style.SUCCESS(f"✓ {post.title} indexed"))
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"✗ {post.title}: {e}"))
+
+    def rebuild(self):
+        """
+        Blue/green: fill a fresh index version while the live one keeps serving,
+        verify it, repoint the alias atomically, then drop the old versions.
+        """
+        from blog.models import Post
+        from blog.redis_vectors import (
+            BUILD_LOCK_KEY, create_index_version, garbage_collect_index_versions, get_redis_client,
+            index_version_name, promote_index_version, set_post_hash, wait_until_indexed,
+        )
+
+        redis_client = get_redis_client()
+        if not redis_client.set(BUILD_LOCK_KEY, 1, nx=True, ex=3600):
+            raise CommandError("Another index rebuild is running")
+        try:
+            version = create_index_version(redis_client)
+            self.stdout.write(f"Building index version {version} (live index keeps serving)...")
+
+            hashes, expected_docs = {}, 0
+            for post in Post.published.all():
+                try:
+                    hashes[post.id] = hashlib.md5(post.body.encode()).hexdigest()
+                    expected_docs += self.index_post(post, version)
+                    self.index_post_vector(post)
+                    self.stdout.write(self.style.SUCCESS(f"✓ {post.title} indexed"))
+                except Exception as e:
+                    redis_client.ft(index_version_name(version)).dropindex(delete_documents=True)
+                    raise CommandError(f"✗ {post.title}: {e} — version {version} discarded, live index unchanged")
+
+            stats = wait_until_indexed(version, client=redis_client)
+            if stats['failures'] or stats['num_docs'] != expected_docs:
+                redis_client.ft(index_version_name(version)).dropindex(delete_documents=True)
+                raise CommandError(
+                    f"Verification failed for version {version}: {stats['num_docs']}/{expected_docs} docs, "
+                    f"{stats['failures']} failures — discarded, live index unchanged"
+                )
+
+            promote_index_version(version, redis_client)
+            self.stdout.write(self.style.SUCCESS(f"✓ Index version {version} is live ({expected_docs} chunks)"))
+            for post_id, content_hash in hashes.items():
+                set_post_hash(post_id, content_hash)
+            for dropped in garbage_collect_index_versions(version, redis_client):
+                self.stdout.write(f"  dropped {dropped}")
+        finally:
+            redis_client.delete(BUILD_LOCK_KEY)
+
+        # Posts edited while the build ran were indexed into the old version; catch up.
+        self.update_live()
+
+    def index_post_vector(self, post):
+        """Post-level vector (title + semantic summary) for the coarse retrieval pass."""
+        from blog.redis_vectors import index_post_vector, post_vector_text
+
+        text = post_vector_text(post.title, post.semantic_summary, post.body)
+        emb_resp = self.run_async(self.client.embeddings(model=None, prompt=text))
+        index_post_vector(post.id, post.title, emb_resp['embedding'])
+
+    def index_post(self, post, version):
+        """
+        Chunk, embed and store one post into `version`. Returns the number of chunks.
+        Semantic summaries are a separate stage (summarize_posts); embedding never waits on them.
+        """
+        from blog.redis_vectors import index_chunk
+
+        client = self.client
+
+        # Section Extraction (H2, H3 tags)
+        sections = re.split(r'<(h[1-4])[^>]*>(.*?)</\1>', post.body, flags=re.IGNORECASE)
+        parts = []
+        current_header = "Introduction"
+        intro_text = sections[0].strip()
+        if intro_text:
+            parts.append((current_header, intro_text))
+
+        for i in range(1, len(sections), 3):
+            tag = sections[i]
+            header = sections[i+1]
+            content = sections[i+2] if i+2 < len(sections) else ""
+            parts.append((header, content))
+
+        CHUNK_SIZE = 1200
+        CHUNK_OVERLAP = 200
+
+        doc_ids = set()
+        for section_title, html_content in parts:
+            clean_text = re.sub('<[^<]+?>', '', html_content).strip()
+            if len(clean_text) < 50: continue
+
+            # Split long sections into chunks with overlap
+            for i in range(0, len(clean_text), CHUNK_SIZE - CHUNK_OVERLAP):
+                chunk_text = clean_text[i:i + CHUNK_SIZE]
+                if len(chunk_text) < 100: continue
+
+                # Prepend section metadata
+                rich_context = f"Post: {post.title} | Section: {section_title}\n{chunk_text}"
+                emb_resp = self.run_async(client.embeddings(model=None, prompt=rich_context))
+                emb = emb_resp['embedding']
+
+                doc_ids.add(index_chunk(
+                    post_id=post.id,
+                    title=post.title,
+                    content=f"[{section_title}] {chunk_text}",
+                    embedding=emb,
+                    version=version,
+                ))
+        # Chunks with the same leading text share a document id, so count distinct ids.
+        return len(doc_ids)
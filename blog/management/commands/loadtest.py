@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.benchmarking import percentile
+
+COMMENT_FORM_RE = re.compile(r'hx-get="(/comment/form/\d+/)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test a running server (e.g. uvicorn) with concurrent page requests, '
+        'optionally while chat SSE streams are held open. Reports req/s and p50/p95/p99.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request (repeatable). Default: / and /health/')
+        parser.add_argument('--requests', type=int, default=500, help='Total page requests')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent page clients')
+        parser.add_argument('--chat-streams', type=int, default=0,
+                            help='Chat SSE streams kept open during the run (mixed load)')
+        parser.add_argument('--chat-message', default='What is this blog about?')
+        parser.add_argument('--max-p99', type=float, default=None,
+                            help='Fail (exit 1) when page p99 latency exceeds this many ms')
+
+    def handle(self, *args, **options):
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            raise CommandError('httpx is required for loadtest')
+        logging.getLogger('httpx').setLevel(logging.WARNING)  # one INFO line per request otherwise
+        paths = options['paths'] or ['/', '/health/']
+        result = asyncio.run(self._run(options, paths))
+
+        self.stdout.write(
+            f"{result['ok']}/{result['total']} OK in {result['elapsed']:.2f}s "
+            f"→ {result['total'] / result['elapsed']:.1f} req/s "
+            f"(concurrency {options['concurrency']}, chat streams {options['chat_streams']})"
+        )
+        latencies = result['latencies']
+        p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        self.stdout.write(f"  latency ms: p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}  max {max(latencies, default=0) * 1000:.1f}")
+        for status, count in sorted(result['statuses'].items(), key=str):
+            self.stdout.write(f"  HTTP {status}: {count}")
+        if result['chat']:
+            self.stdout.write(f"  chat streams completed: {result['chat']}")
+
+        if result['ok'] < result['total']:
+            raise CommandError(f"{result['total'] - result['ok']} requests failed")
+        if options['max_p99'] is not None and p99 > options['max_p99']:
+            raise CommandError(f"p99 {p99:.1f}ms exceeds budget {options['max_p99']:.1f}ms")
+        self.stdout.write(self.style.SUCCESS("✓ Load test passed"))
+
+    async def _run(self, options, paths):
+        import httpx
+
+        limits = httpx.Limits(max_connections=options['concurrency'] + options['chat_streams'] + 5)
+        timeout = httpx.Timeout(30.0, read=120.0)
+        async with httpx.AsyncClient(base_url=options['url'], limits=limits, timeout=timeout) as client:
+            # Warm up: prime caches and find a comment form to get a CSRF cookie from.
+            csrf_path = None
+            for path in paths:
+                try:
+                    response = await client.get(path)
+                except httpx.HTTPError as e:
+                    raise CommandError(f"Cannot reach {options['url']}{path}: {e}")
+                match = COMMENT_FORM_RE.search(response.text)
+                csrf_path = csrf_path or (match and match.group(1))
+
+            stop = asyncio.Event()
+            chat_done = []
+            chat_tasks = []
+            if options['chat_streams']:
+                headers = await self._csrf_headers(client, csrf_path, options['url'])
+                chat_tasks = [
+                    asyncio.create_task(self._chat_loop(client, headers, options['chat_message'], stop, chat_done))
+                    for _ in range(options['chat_streams'])
+                ]
+                await asyncio.sleep(0.5)  # let the streams open before measuring
+
+            total = options['requests']
+            queue = asyncio.Queue()
+            for i in range(total):
+                queue.put_nowait(paths[i % len(paths)])
+            latencies, statuses = [], {}
+
+            async def worker():
+                while True:
+                    try:
+                        path = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    started = time.perf_counter()
+                    try:
+                        response = await client.get(path)
+                        status = response.status_code
+                    except httpx.HTTPError as e:
+                        status = type(e).__name__
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+            elapsed = time.perf_counter() - started
+
+            stop.set()
+            for task in chat_tasks:
+                task.cancel()
+            await asyncio.gather(*chat_tasks, return_exceptions=True)
+
+        ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+        return {
+            'total': total, 'ok': ok, 'elapsed': elapsed,
+            'latencies': latencies, 'statuses': statuses, 'chat': len(chat_done),
+        }
+
+    async def _csrf_headers(self, client, csrf_path, base_url):
+        if not csrf_path:
+            raise CommandError(
+                'Chat streams need a CSRF cookie: include a post detail page in --path '
+                'so its comment form can be fetched.'
+            )
+        await client.get(csrf_path)
+        token = client.cookies.get('csrftoken')
+        if not token:
+            raise CommandError(f'No csrftoken cookie set by {csrf_path}')
+        return {'X-CSRFToken': token, 'Referer': base_url + '/'}
+
+    async def _chat_loop(self, client, headers, message, stop, done):
+        """
+        Keep one chat stream open at a time, reopening until the page load finishes.
+        Messages are numbered so the exact-answer cache doesn't short-circuit them;
+        the 'chat' rate limit still applies per client IP.
+        """
+        n = 0
+        while not stop.is_set():
+            n += 1
+            payload = {'message': f"{message} ({n})"}
+            async with client.stream('POST', '/api/chat/', json=payload, headers=headers) as response:
+                async for _ in response.aiter_raw():
+                    if stop.is_set():
+                        return
+            if response.status_code == 200:
+                done.append(n)
+            else:
+                await asyncio.sleep(1)
@@ -0,0 +1,46 @@
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.benchmarking import boot_worker
+
+
+class Command(BaseCommand):
+    help = 'Profile worker boot (import time, resident memory, eager heavy imports) and enforce budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters to boot; medians are reported')
+        parser.add_argument('--top', type=int, default=12, help='Packages to list by import time')
+        parser.add_argument('--max-import-ms', type=float, default=None, help='Fail if boot import time exceeds this')
+        parser.add_argument('--max-rss-mb', type=float, default=None, help='Fail if resident memory after boot exceeds this')
+
+    def handle(self, *args, **options):
+        runs = [self.boot_once() for _ in range(max(1, options['runs']))]
+        import_ms = statistics.median(r['import_ms'] for r in runs)
+        boot_ms = statistics.median(r['boot_ms'] for r in runs)
+        rss_mb = statistics.median(r['rss_kb'] for r in runs) / 1024
+        eager = sorted({m for r in runs for m in r['eager']})
+
+        self.stdout.write(f"Worker boot ({len(runs)} runs, median): {boot_ms:.0f} ms wall, "
+                          f"{import_ms:.0f} ms in imports, {rss_mb:.1f} MB resident")
+        self.stdout.write("Import time by package (self time, first run):")
+        for package, ms in runs[0]['packages'][:options['top']]:
+            self.stdout.write(f"  {ms:8.1f} ms  {package}")
+
+        failures = []
+        if eager:
+            failures.append(f"imported at boot but should be lazy: {', '.join(eager)}")
+        if options['max_import_ms'] is not None and import_ms > options['max_import_ms']:
+            failures.append(f"import time {import_ms:.0f} ms > budget {options['max_import_ms']:.0f} ms")
+        if options['max_rss_mb'] is not None and rss_mb > options['max_rss_mb']:
+            failures.append(f"resident memory {rss_mb:.1f} MB > budget {options['max_rss_mb']:.0f} MB")
+        if failures:
+            raise CommandError("Boot budget exceeded — " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("✓ Worker boot within budget"))
+
+    def boot_once(self) -> dict:
+        from django.conf import settings
+        try:
+            return boot_worker(settings.BASE_DIR)
+        except RuntimeError as e:
+            raise CommandError(str(e))
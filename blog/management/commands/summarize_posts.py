@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Generate semantic summaries for published posts whose body changed since the last summary'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-summarize every post, even unchanged ones')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Concurrent completion requests (default: AI_POST_SUMMARY_CONCURRENCY)')
+
+    def handle(self, *args, **options):
+        from asgiref.sync import async_to_sync
+        from blog.summaries import generate_summaries
+
+        def report(post, error):
+            if error:
+                self.stdout.write(self.style.ERROR(f"✗ {post.title}: {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✓ {post.title} summarized"))
+
+        counts = async_to_sync(generate_summaries)(
+            force=options.get('force'), concurrency=options.get('concurrency'), on_result=report,
+        )
+        self.stdout.write(
+            f"Summaries: {counts['summarized']} written, {counts['skipped']} unchanged, {counts['failed']} failed."
+        )
@@ -0,0 +1,109 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Warm the site inventory, popular pages and frequent query embeddings before serving traffic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20, help='Newest posts to pre-render')
+        parser.add_argument('--tags', type=int, default=5, help='Largest tag listings to pre-render')
+        parser.add_argument('--queries', type=int, default=50, help='Most frequent chat and search queries to pre-embed')
+        parser.add_argument('--time-budget', type=float, default=60.0, help='Stop warming after this many seconds')
+
+    def handle(self, *args, **options):
+        from asgiref.sync import async_to_sync
+        from blog.query_log import top_queries
+
+        paths = self.page_paths(options['posts'], options['tags'])
+        queries = []
+        for kind in ('chat', 'search'):
+            try:
+                queries += [text for text, _ in top_queries(kind, options['queries'])]
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"  query log unavailable: {e}"))
+                break
+        queries = list(dict.fromkeys(queries))  # de-duplicate, keep frequency order
+
+        stats = async_to_sync(self.warm)(paths, queries, options['time_budget'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Warmed inventory ({stats['inventory']} posts), {stats['pages']}/{len(paths)} pages, "
+            f"{stats['embeddings']}/{len(queries)} query embeddings in {stats['seconds']:.1f}s"
+        ))
+
+    def page_paths(self, posts, tags):
+        from django.db.models import Count
+        from django.urls import reverse
+        from taggit.models import Tag
+        from blog.models import Post
+
+        paths = [reverse('blog:post_list')]
+        paths += [post.get_absolute_url() for post in Post.published.only('slug')[:posts]]
+        top_tags = (
+            Tag.objects.filter(post__status='published')
+            .annotate(n=Count('post')).order_by('-n', 'name')[:tags]
+        )
+        paths += [reverse('blog:post_tag', args=[tag.slug]) for tag in top_tags]
+        return paths
+
+    async def warm(self, paths, queries, budget):
+        """One event loop for everything, so pages and embeddings share its Redis and AI pools."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + budget
+        stats = {'inventory': 0, 'pages': 0, 'embeddings': 0}
+
+        from blog.ai_utils import get_site_inventory
+        stats['inventory'], _ = await get_site_inventory()
+
+        # Pages (CPU: markdown, templates) and embeddings (AI host) warm side by side.
+        await asyncio.gather(
+            self.warm_pages(paths, deadline, stats),
+            self.warm_embeddings(queries, deadline, stats),
+        )
+        stats['seconds'] = loop.time() - started
+        return stats
+
+    async def warm_pages(self, paths, deadline, stats):
+        """Render through the full stack: fills the page cache and template fragments."""
+        from django.conf import settings
+        from django.test import AsyncClient
+
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        client = AsyncClient(headers={'host': host})
+        loop = asyncio.get_running_loop()
+        for path in paths:
+            if loop.time() > deadline:
+                self.stdout.write(self.style.WARNING("  time budget spent — remaining pages left cold"))
+                return
+            try:
+                response = await client.get(path, secure=True)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"✗ {path}: {e}"))
+                continue
+            if response.status_code == 200:
+                stats['pages'] += 1
+            else:
+                self.stdout.write(self.style.WARNING(f"  {path}: HTTP {response.status_code}"))
+
+    async def warm_embeddings(self, queries, deadline, stats):
+        from blog.ai_utils import new_ai_client
+        from blog.redis_vectors import cache_embedding_async, get_cached_embedding_async
+
+        client = new_ai_client()
+        loop = asyncio.get_running_loop()
+        try:
+            for text in queries:
+                if loop.time() > deadline or not client.available:
+                    self.stdout.write(self.style.WARNING("  AI host unavailable or time budget spent — embeddings left cold"))
+                    return
+                try:
+                    if await get_cached_embedding_async(text) is None:
+                        emb_resp = await client.embeddings(model=None, prompt=text)
+                        await cache_embedding_async(text, emb_resp['embedding'])
+                    stats['embeddings'] += 1
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"✗ embedding for {text[:40]!r}: {e}"))
+        finally:
+            await client.aclose()
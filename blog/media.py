@@ -0,0 +1,140 @@
+"""
+Production media serving for /media/ (user uploads on the PVC).
+
+- Offloads the transfer to nginx via X-Accel-Redirect when
+  MEDIA_ACCEL_REDIRECT_PREFIX is configured.
+- Otherwise streams the file in blocks from a worker thread; Django's ASGI
+  handler would read a FileResponse fully into memory before sending it.
+- Honours ETag/Last-Modified revalidation and single byte ranges.
+- Image derivatives (named after a digest of their original) are cached immutably.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .images import VARIANT_NAME_RE
+
+MEDIA_BLOCK_SIZE = 256 * 1024
+IMMUTABLE_MAX_AGE = 31_536_000  # 1 year
+MUTABLE_MAX_AGE = 86_400
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_content_addressed(path: str) -> bool:
+    """Only generated derivatives, e.g. featured_image/2026/05/16/cover.3f9a1c2e4b.w640.webp."""
+    return bool(VARIANT_NAME_RE.search(os.path.basename(path)))
+
+
+def parse_range(header: str, size: int):
+    """
+    Parse a single `bytes=` range into (start, end) inclusive.
+    Returns None when there is no usable range header (serve the whole file)
+    and False when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+async def _aiter_file(full_path: str, start: int, length: int):
+    """Yield `length` bytes from `start`, reading off the event loop."""
+    f = await sync_to_async(open, thread_sensitive=False)(full_path, 'rb')
+    try:
+        if start:
+            f.seek(start)
+        remaining = length
+        read = sync_to_async(f.read, thread_sensitive=False)
+        while remaining > 0:
+            chunk = await read(min(MEDIA_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+async def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    size = stat.st_size
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = int(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path)
+
+    headers = HttpResponse(content_type=content_type or 'application/octet-stream')
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(last_modified)
+    headers['Accept-Ranges'] = 'bytes'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if is_content_addressed(path):
+        headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        headers['Cache-Control'] = f'public, max-age={MUTABLE_MAX_AGE}'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified, response=headers)
+    if not_modified is not headers:
+        return not_modified
+
+    accel_prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if accel_prefix:
+        # nginx takes over: it serves the bytes and handles Range itself.
+        headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(path)}"
+        return headers
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.headers.get('Range', ''), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(
+        _aiter_file(full_path, start, length),
+        status=206 if byte_range else 200,
+        content_type=headers['Content-Type'],
+    )
+    for header in ('ETag', 'Last-Modified', 'Accept-Ranges', 'Cache-Control', 'Content-Encoding'):
+        if header in headers:
+            response[header] = headers[header]
+    response['Content-Length'] = str(length)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='semantic_summary_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -4,8 +4,11 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 from taggit.managers import TaggableManager
 from django.contrib.postgres.indexes import GinIndex
+import hashlib
+import json
 import re
-import markdown
+
+CODE_BLOCK_RE = re.compile(r'^(```|~~~|    \S|\t\S)|<pre|<code', re.M)
 
 
 class PublishedManager(models.Manager):
@@ -22,6 +25,10 @@ class Post(models.Model):
     title    = models.CharField(max_length=250)
     slug     = models.SlugField(max_length=250, unique_for_date='publish')
     image    = models.ImageField(upload_to='featured_image/%Y/%m/%d/', blank=True, null=True)
+    # Filled by blog.images after upload — intrinsic size for layout and resized derivatives.
+    image_width    = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height   = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     author   = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
     body     = models.TextField(help_text='Markdown supported')
     publish  = models.DateTimeField(default=timezone.now, db_index=True)
@@ -30,10 +37,17 @@ class Post(models.Model):
     status   = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft', db_index=True)
     tags     = TaggableManager()
     semantic_summary = models.TextField(blank=True, help_text='AI-generated semantic summary for RAG indexing')
+    # md5 of the body the summary was written from — filled by blog.summaries.
+    semantic_summary_hash = models.CharField(max_length=32, blank=True, editable=False)
 
     objects  = models.Manager()
     published = PublishedManager()
 
+    # Written by blog.images from a background thread with update(); a full
+    # save of an instance loaded earlier (e.g. the admin form) would put back
+    # stale values, so ordinary saves of existing rows leave them out.
+    BACKGROUND_FIELDS = ('image_width', 'image_height', 'image_variants')
+
     class Meta:
         ordering = ('-publish',)
         indexes = [
@@ -44,20 +58,43 @@ class Post(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.BACKGROUND_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('blog:post_detail', args=[self.slug])
 
     @property
     def body_html(self):
         """Renders body markdown to HTML with code highlighting support."""
+        import markdown  # lazy: migrations and most commands never render a post
         return markdown.markdown(self.body, extensions=['extra', 'codehilite', 'toc'])
 
+    @property
+    def has_code_blocks(self) -> bool:
+        """Fenced, indented or raw-HTML code — decides whether highlight.js is loaded."""
+        return bool(CODE_BLOCK_RE.search(self.body))
+
     @property
     def read_time(self) -> int:
         """Estimated reading time in minutes (≈200 wpm)."""
         text = self.body # Plain text for markdown is close enough
         return max(1, round(len(text.split()) / 200))
 
+    @property
+    def image_variants_version(self) -> str:
+        """
+        Short digest of the stored derivatives, for template fragment keys.
+        Variants are written with update(), which leaves `updated` untouched.
+        """
+        payload = json.dumps(self.image_variants or {}, sort_keys=True)
+        return hashlib.md5(payload.encode()).hexdigest()[:12]
+
     def get_comments(self):
         """Return root-level active comments only."""
         return self.comments.filter(parent=None, active=True)
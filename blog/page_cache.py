@@ -0,0 +1,192 @@
+"""
+Anonymous full-page cache with generational invalidation.
+
+Every cached page remembers the content generations it was rendered with.
+A read fetches the page and its generation counters in a single MGET, so a
+hit costs one Redis round trip and no SQL.
+
+- Post saves/deletes bump the global generation (listings, similar posts and
+  every detail page may show the changed post).
+- Comment saves/deletes bump only the owning post's generation.
+
+Pages are keyed by view, URL kwargs and page number, not by the raw URL:
+anything else in the query string (search, tracking params, junk) bypasses
+the cache instead of minting new 24h entries.
+
+The generations also yield the ETag, so `If-None-Match` revalidations are
+answered with a 304 from that same MGET.
+"""
+import hashlib
+import logging
+import re
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .async_cache import async_cache
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24  # generations do the invalidation; TTL only bounds memory
+GLOBAL_GENERATION_KEY = "page:gen:global"
+PAGE_NUMBER_RE = re.compile(r'^[1-9]\d{0,5}$')
+
+
+def post_generation_key(slug: str) -> str:
+    return f"page:gen:post:{slug}"
+
+
+def page_identity(view_name: str, kwargs: dict, request, paginated: bool = False) -> str | None:
+    """
+    Canonical name of a cacheable page: the view, its URL kwargs and (for
+    paginated views) a well-formed page number. None for anything else —
+    arbitrary query strings must not mint new cache entries.
+    """
+    allowed = {'page'} if paginated else set()
+    if not set(request.GET) <= allowed:
+        return None
+    pages = request.GET.getlist('page') or ['1']
+    if len(pages) != 1 or not PAGE_NUMBER_RE.match(pages[0]):
+        return None
+    parts = [view_name, *(f"{k}={v}" for k, v in sorted(kwargs.items()))]
+    if paginated:
+        parts.append(f"page={pages[0]}")
+    return '|'.join(parts)
+
+
+def page_cache_key(identity: str) -> str:
+    return f"page:html:{hashlib.md5(identity.encode()).hexdigest()}"
+
+
+def skip_page_cache(response):
+    """Render normally but don't store: e.g. an unknown tag or an out-of-range page."""
+    response.skip_page_cache = True
+    return response
+
+
+def _bump(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing (first write or evicted): seed with a clock value so a counter
+        # that restarts can never collide with generations stored in old pages.
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_global_generation():
+    _bump(GLOBAL_GENERATION_KEY)
+
+
+def bump_post_generation(slug: str):
+    _bump(post_generation_key(slug))
+
+
+def get_generations(slug: str | None = None) -> tuple:
+    """Current (global, post) generations — missing counters read as 0."""
+    keys = [GLOBAL_GENERATION_KEY] + ([post_generation_key(slug)] if slug else [])
+    values = cache.get_many(keys)
+    return tuple(values.get(k, 0) for k in keys)
+
+
+def page_etag(identity: str, generations: tuple) -> str:
+    """Weak validator: the same page under the same generations renders the same bytes."""
+    digest = hashlib.md5(f"{identity}:{generations}".encode()).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+
+def _finalize(request, response, etag: str, last_modified: int | None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    # Browsers may keep the page but must revalidate — a 304 costs one MGET.
+    patch_cache_control(response, no_cache=True)
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+
+
+def _is_storable(request, response) -> bool:
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not getattr(response, 'skip_page_cache', False)
+        # A rendered {% csrf_token %} means per-visitor output.
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _entry(generations: tuple, response, modified_at) -> dict:
+    return {
+        'generations': generations,
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'last_modified': int(modified_at.timestamp()) if modified_at else None,
+    }
+
+
+def _cached_response(request, identity: str, values: dict, key: str, gen_keys: list):
+    """(response or None, generations, etag) from one MGET result."""
+    generations = tuple(values.get(k, 0) for k in gen_keys)
+    etag = page_etag(identity, generations)
+    entry = values.get(key)
+    if entry and entry['generations'] == generations:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['X-Page-Cache'] = 'HIT'
+        return _finalize(request, response, etag, entry.get('last_modified')), generations, etag
+    return None, generations, etag
+
+
+def cache_anonymous_page(
+    slug_kwarg: str | None = None,
+    last_modified_func=None,
+    paginated: bool = False,
+    timeout: int = PAGE_CACHE_TIMEOUT,
+):
+    """
+    Cache full responses for anonymous GETs and answer conditional requests.
+    `slug_kwarg` names the URL kwarg holding the post slug, which ties the page
+    to that post's comment generation in addition to the global one.
+    `last_modified_func(request, *args, **kwargs)` returns a datetime and only
+    runs on a cache miss; its value is stored alongside the page. Both the view
+    and `last_modified_func` must be coroutine functions.
+
+    Only URLs made of the view's kwargs (and `?page=N` when `paginated`) are
+    cached; views call skip_page_cache() for pages that should not be stored.
+    """
+    def _gen_keys(kwargs):
+        slug = kwargs.get(slug_kwarg) if slug_kwarg else None
+        return [GLOBAL_GENERATION_KEY] + ([post_generation_key(slug)] if slug else [])
+
+    def decorator(view_func):
+        if not iscoroutinefunction(view_func):
+            raise TypeError(f"cache_anonymous_page only wraps async views, not {view_func.__qualname__}")
+        view_name = f"{view_func.__module__}.{view_func.__qualname__}"
+
+        @wraps(view_func)
+        async def _async_wrapped(request, *args, **kwargs):
+            identity = None
+            if request.method in ('GET', 'HEAD'):
+                identity = page_identity(view_name, kwargs, request, paginated)
+            if identity is None or (await request.auser()).is_authenticated:
+                return await view_func(request, *args, **kwargs)
+
+            key, gen_keys = page_cache_key(identity), _gen_keys(kwargs)
+            values = await async_cache.get_many([key] + gen_keys)
+            hit, generations, etag = _cached_response(request, identity, values, key, gen_keys)
+            if hit is not None:
+                return hit
+
+            response = await view_func(request, *args, **kwargs)
+            if not _is_storable(request, response):
+                return response
+            modified_at = await last_modified_func(request, *args, **kwargs) if last_modified_func else None
+            entry = _entry(generations, response, modified_at)
+            await async_cache.set(key, entry, timeout=timeout)
+            response['X-Page-Cache'] = 'MISS'
+            return _finalize(request, response, etag, entry['last_modified'])
+        return _async_wrapped
+    return decorator
@@ -0,0 +1,105 @@
+"""
+Bounded log of what visitors ask, used to warm caches after a deploy.
+
+Chat questions and live-search queries are counted per day in Redis sorted
+sets (querylog:<kind>:<YYYYMMDD>) that expire after QUERY_LOG_DAYS.
+
+Nothing a single visitor typed is kept verbatim:
+- search queries are stored in canonical form (case-folded, whitespace
+  collapsed) — the form live search embeds, so warmed embeddings are hit;
+- chat questions are counted by hash, and the text (needed to pre-embed it)
+  is only kept once QUERY_TEXT_MIN_COUNT requests asked it the same day.
+
+Each day's set is trimmed to its QUERY_LOG_MAX_PER_DAY most frequent entries
+at most once per QUERY_LOG_TRIM_INTERVAL, so memory stays bounded whatever
+the traffic while new entries still get time to build a count.
+"""
+import datetime
+import hashlib
+import logging
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('chat', 'search')
+QUERY_LOG_DAYS = 7
+QUERY_LOG_MAX_PER_DAY = 5000
+QUERY_LOG_TRIM_INTERVAL = 300  # seconds
+QUERY_TEXT_MIN_COUNT = 3
+MIN_QUERY_CHARS = 3
+MAX_QUERY_CHARS = 200
+
+
+def canonical_query(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+def _day_key(kind: str, day: datetime.date) -> str:
+    return f"querylog:{kind}:{day:%Y%m%d}"
+
+
+def _texts_key(kind: str, day: datetime.date) -> str:
+    return f"querylog:{kind}:{day:%Y%m%d}:texts"
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+async def log_query(kind: str, text: str):
+    """Count one occurrence of `text`. Never raises — logging must not break a request."""
+    text = canonical_query(text) if kind == 'search' else text.strip()
+    if kind not in KINDS or not MIN_QUERY_CHARS <= len(text) <= MAX_QUERY_CHARS:
+        return
+    from .redis_vectors import get_async_redis_client
+
+    today = timezone.now().date()
+    key = _day_key(kind, today)
+    member = text if kind == 'search' else _digest(text)
+    ttl = QUERY_LOG_DAYS * 86400
+    try:
+        client = get_async_redis_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.zincrby(key, 1, member)
+        pipe.expire(key, ttl)
+        pipe.set(f"{key}:trimmed", 1, nx=True, ex=QUERY_LOG_TRIM_INTERVAL)
+        count, _, trim_due = await pipe.execute()
+
+        pipe = client.pipeline(transaction=False)
+        if trim_due:
+            pipe.zremrangebyrank(key, 0, -(QUERY_LOG_MAX_PER_DAY + 1))  # drop the least frequent
+        if kind == 'chat' and count >= QUERY_TEXT_MIN_COUNT:
+            pipe.hsetnx(_texts_key(kind, today), member, text)
+            pipe.expire(_texts_key(kind, today), ttl)
+        if len(pipe):
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Query log unavailable: {e}")
+
+
+def top_queries(kind: str, limit: int = 50, days: int = QUERY_LOG_DAYS) -> list:
+    """Most frequent texts over the last `days` days, as [(text, count)], most frequent first."""
+    from .redis_vectors import _decode, get_redis_client
+
+    client = get_redis_client()
+    today = timezone.now().date()
+    day_list = [today - datetime.timedelta(days=i) for i in range(days)]
+    dest = f"querylog:{kind}:top"
+    pipe = client.pipeline(transaction=False)
+    pipe.zunionstore(dest, [_day_key(kind, day) for day in day_list])
+    # Chat hashes whose text was never kept can't be warmed — read a few extra.
+    pipe.zrevrange(dest, 0, (limit if kind == 'search' else limit * 4) - 1, withscores=True)
+    pipe.delete(dest)
+    _, top, _ = pipe.execute()
+    top = [(_decode(member), int(count)) for member, count in top]
+    if kind == 'search':
+        return top
+
+    texts = {}
+    pipe = client.pipeline(transaction=False)
+    for day in day_list:
+        pipe.hgetall(_texts_key(kind, day))
+    for day_texts in pipe.execute():
+        texts.update({_decode(k): _decode(v) for k, v in day_texts.items()})
+    return [(texts[digest], count) for digest, count in top if digest in texts][:limit]
@@ -0,0 +1,131 @@
+"""
+Atomic sliding-window rate limiting in Redis.
+
+Each (policy, client IP) pair is a sorted set of request timestamps. A Lua
+script trims the window, counts and records the hit in one round trip, so
+concurrent requests cannot race past the limit. Works for sync and async views.
+"""
+import logging
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# policy → (max requests, window seconds)
+RATE_LIMITS = {
+    'comment':  (1, 10),   # one comment or reply per 10s
+    'chat':     (10, 60),  # LLM generations
+    'search':   (30, 10),  # live search may hit the embedding model
+    'prefetch': (20, 60),  # type-ahead chat retrieval warm-up
+    'stream':   (30, 60),  # chat stream resumes after a dropped connection
+}
+
+SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+if redis.call('ZCARD', key) < limit then
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('PEXPIRE', key, window)
+    return {1, 0}
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {0, tonumber(oldest[2]) + window - now}
+"""
+
+_script = None
+_async_scripts = {}  # event loop → script on that loop's client
+
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def _get_script():
+    global _script
+    if _script is None:
+        from .redis_vectors import get_redis_client
+        _script = get_redis_client().register_script(SLIDING_WINDOW_LUA)
+    return _script
+
+
+def _get_async_script():
+    from .loops import for_running_loop
+    from .redis_vectors import get_async_redis_client
+    return for_running_loop(_async_scripts, lambda: get_async_redis_client().register_script(SLIDING_WINDOW_LUA))
+
+
+def _script_args(policy: str, request):
+    limit, window = RATE_LIMITS[policy]
+    keys = [f"ratelimit:{policy}:{get_client_ip(request)}"]
+    return keys, [window * 1000, limit, uuid.uuid4().hex]
+
+
+def check_rate_limit(policy: str, request) -> int:
+    """Record a hit. Returns 0 if allowed, else seconds until the next slot."""
+    keys, args = _script_args(policy, request)
+    try:
+        allowed, retry_ms = _get_script()(keys=keys, args=args)
+    except Exception as e:
+        logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+        return 0
+    return 0 if allowed else max(1, -(-int(retry_ms) // 1000))
+
+
+async def acheck_rate_limit(policy: str, request) -> int:
+    keys, args = _script_args(policy, request)
+    try:
+        allowed, retry_ms = await _get_async_script()(keys=keys, args=args)
+    except Exception as e:
+        logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+        return 0
+    return 0 if allowed else max(1, -(-int(retry_ms) // 1000))
+
+
+def too_many_requests(retry_after: int) -> HttpResponse:
+    response = HttpResponse(
+        f'Rate limit exceeded. Please wait {retry_after}s.',
+        status=429, content_type='text/plain',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(policy: str, methods=None):
+    """
+    Limit a view per client IP under `policy` (see RATE_LIMITS).
+    `methods` restricts counting to those HTTP methods, e.g. ('POST',).
+    """
+    if policy not in RATE_LIMITS:
+        raise ValueError(f"Unknown rate limit policy: {policy}")
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _async_wrapped(request, *args, **kwargs):
+                if methods is None or request.method in methods:
+                    retry_after = await acheck_rate_limit(policy, request)
+                    if retry_after:
+                        return too_many_requests(retry_after)
+                return await view_func(request, *args, **kwargs)
+            return _async_wrapped
+
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                retry_after = check_rate_limit(policy, request)
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
@@ -1,24 +1,36 @@
 import hashlib
 import json
 import logging
+import re
 import struct
+import time
 from django.conf import settings
 from django.core.cache import cache
 import redis
 
 logger = logging.getLogger(__name__)
-import redis.asyncio as async_redis
-from redis.commands.search.field import VectorField, TextField, NumericField
-from redis.commands.search.index_definition import IndexDefinition, IndexType
-from redis.commands.search.query import Query
+# redis.asyncio and the RediSearch command modules are imported where used:
+# most processes (migrations, short commands, page views) never touch them.
 
 # Index configuration
+# INDEX_NAME is an alias. Each full rebuild creates a new versioned index
+# (idx:blog_chunks:v<N> over chunk_v<N>:* documents), fills and verifies it,
+# then repoints the alias with FT.ALIASUPDATE — queries never see a partial index.
 INDEX_NAME = "idx:blog_chunks"
 VECTOR_DIM = 768  # nomic-embed-text dimension
-DOC_PREFIX = "chunk:"
+DOC_PREFIX = "chunk:"  # pre-versioning (legacy) index documents
+VERSION_COUNTER_KEY = f"{INDEX_NAME}:next_version"
+BUILD_LOCK_KEY = f"{INDEX_NAME}:building"
+VERSIONED_INDEX_RE = re.compile(rf"^{re.escape(INDEX_NAME)}:v(\d+)$")
+
+# Post-level index: one vector per post (title + semantic summary). Small enough
+# to search on every keystroke, and narrows chunk KNN to the best few posts.
+POST_INDEX_NAME = "idx:blog_posts"
+POST_DOC_PREFIX = "post_vec:"
+POST_SOURCE_CHARS = 1000  # body excerpt used until the post has a semantic summary
 
 _redis_client = None
-_async_redis_client = None
+_async_redis_clients = {}  # event loop → redis.asyncio client
 
 def get_redis_client():
     """Get Redis client - singleton pattern for connection reuse."""
@@ -28,16 +40,19 @@ def get_redis_client():
         _redis_client = redis.from_url(redis_url, decode_responses=False)
     return _redis_client
 
+def _new_async_redis_client():
+    import redis.asyncio as async_redis
+    redis_url = settings.CACHES.get('default', {}).get('LOCATION', 'redis://redis:6379/1')
+    return async_redis.from_url(redis_url, decode_responses=False)
+
 def get_async_redis_client():
-    """Get Async Redis client for use in async views."""
-    global _async_redis_client
-    if _async_redis_client is None:
-        redis_url = settings.CACHES.get('default', {}).get('LOCATION', 'redis://redis:6379/1')
-        _async_redis_client = async_redis.from_url(redis_url, decode_responses=False)
-    return _async_redis_client
+    """Async Redis client of the running event loop (its pool can't be shared across loops)."""
+    from .loops import for_running_loop
+    return for_running_loop(_async_redis_clients, _new_async_redis_client, close=lambda client: client.aclose())
 
 def get_schema():
     """Shared schema definition for Redis vector index."""
+    from redis.commands.search.field import NumericField, TextField, VectorField
     return (
         TextField("$.title", as_name="title"),
         TextField("$.content", as_name="content"),
@@ -56,41 +71,133 @@ def get_schema():
         )
     )
 
+def get_post_schema():
+    """Schema for the post-level index."""
+    from redis.commands.search.field import NumericField, TextField, VectorField
+    return (
+        TextField("$.title", as_name="title"),
+        NumericField("$.post_id", as_name="post_id"),
+        VectorField(
+            "$.embedding",
+            "FLAT",  # one vector per post: exact search is cheap and needs no graph
+            {"TYPE": "FLOAT32", "DIM": VECTOR_DIM, "DISTANCE_METRIC": "COSINE"},
+            as_name="embedding"
+        )
+    )
+
+def index_version_name(version: int) -> str:
+    return f"{INDEX_NAME}:v{version}"
+
+def version_doc_prefix(version: int) -> str:
+    # Must not start with DOC_PREFIX, or the legacy index would pick these up too.
+    return DOC_PREFIX if version == 0 else f"chunk_v{version}:"
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+def get_live_version(client=None):
+    """Version the alias points at: N, 0 for the legacy unversioned index, None if none."""
+    client = client or get_redis_client()
+    try:
+        info = client.ft(INDEX_NAME).info()
+    except redis.ResponseError:
+        return None
+    match = VERSIONED_INDEX_RE.match(_decode(info.get('index_name', INDEX_NAME)))
+    return int(match.group(1)) if match else 0
+
+def create_index_version(client=None) -> int:
+    """Create a new, empty versioned index. It serves nothing until promoted."""
+    from redis.commands.search.index_definition import IndexDefinition, IndexType
+    client = client or get_redis_client()
+    version = int(client.incr(VERSION_COUNTER_KEY))
+    definition = IndexDefinition(prefix=[version_doc_prefix(version)], index_type=IndexType.JSON)
+    client.ft(index_version_name(version)).create_index(get_schema(), definition=definition)
+    return version
+
+def index_version_stats(version: int, client=None) -> dict:
+    client = client or get_redis_client()
+    info = client.ft(index_version_name(version)).info()
+    return {
+        'num_docs': int(info.get('num_docs', 0)),
+        'indexing': int(float(info.get('indexing', 0))),
+        'failures': int(float(info.get('hash_indexing_failures', 0))),
+    }
+
+def wait_until_indexed(version: int, timeout: float = 60, client=None) -> dict:
+    """Poll until background indexing of `version` finishes (or times out); returns its stats."""
+    deadline = time.monotonic() + timeout
+    while True:
+        stats = index_version_stats(version, client)
+        if not stats['indexing'] or time.monotonic() > deadline:
+            return stats
+        time.sleep(0.5)
+
+def promote_index_version(version: int, client=None):
+    """Atomically point the alias at `version`."""
+    client = client or get_redis_client()
+    name = index_version_name(version)
+    live = get_live_version(client)
+    if live == 0:
+        # One-time migration: the legacy index owns the alias name, so drop it
+        # (documents stay until garbage collection) and alias in its place.
+        client.ft(INDEX_NAME).dropindex(delete_documents=False)
+        live = None
+    if live is None:
+        client.ft(name).aliasadd(INDEX_NAME)
+    else:
+        client.ft(name).aliasupdate(INDEX_NAME)
+
+def _delete_by_prefix(client, prefix: str) -> int:
+    deleted = 0
+    for key in client.scan_iter(match=f"{prefix}*", count=500):
+        client.delete(key)
+        deleted += 1
+    return deleted
+
+def garbage_collect_index_versions(keep_version: int, client=None) -> list:
+    """Drop every versioned index (and its documents) older than `keep_version`."""
+    client = client or get_redis_client()
+    dropped = []
+    for raw in client.execute_command('FT._LIST'):
+        match = VERSIONED_INDEX_RE.match(_decode(raw))
+        if match and int(match.group(1)) < keep_version:
+            client.ft(_decode(raw)).dropindex(delete_documents=True)
+            dropped.append(_decode(raw))
+    if get_live_version(client) != 0:
+        legacy = _delete_by_prefix(client, DOC_PREFIX)
+        if legacy:
+            dropped.append(f"{legacy} legacy documents")
+    return dropped
+
 def ensure_index_exists():
-    """Create the vector index if it doesn't exist (Sync version)."""
+    """Make sure the alias resolves; on a fresh Redis, create and promote v1 (Sync version)."""
     client = get_redis_client()
+    if get_live_version(client) is not None:
+        return True
     try:
-        client.ft(INDEX_NAME).info()
+        promote_index_version(create_index_version(client), client)
         return True
-    except redis.ResponseError:
-        try:
-            definition = IndexDefinition(prefix=[DOC_PREFIX], index_type=IndexType.JSON)
-            client.ft(INDEX_NAME).create_index(get_schema(), definition=definition)
-            return True
-        except Exception as e:
-            logger.error('Failed to create Redis index: %s', e)
-            return False
+    except Exception as e:
+        logger.error('Failed to create Redis index: %s', e)
+        return False
 
 async def ensure_index_exists_async():
-    """Create the vector index if it doesn't exist (Async version)."""
+    """Check that the alias resolves (Async version). Creation is left to index_posts."""
     client = get_async_redis_client()
     try:
         await client.ft(INDEX_NAME).info()
         return True
     except redis.ResponseError:
-        try:
-            definition = IndexDefinition(prefix=[DOC_PREFIX], index_type=IndexType.JSON)
-            await client.ft(INDEX_NAME).create_index(get_schema(), definition=definition)
-            return True
-        except Exception:
-            return False
+        return False
 
-def index_chunk(post_id: int, title: str, content: str, embedding: list) -> str:
-    """Index a single chunk in Redis (Sync)."""
+def index_chunk(post_id: int, title: str, content: str, embedding: list, version: int | None = None) -> str:
+    """Index a single chunk in Redis (Sync). Defaults to the live index version."""
     client = get_redis_client()
-    ensure_index_exists()
+    if version is None:
+        ensure_index_exists()
+        version = get_live_version(client)
     content_hash = hashlib.md5(content[:100].encode()).hexdigest()[:8]
-    doc_id = f"{DOC_PREFIX}{post_id}:{content_hash}"
+    doc_id = f"{version_doc_prefix(version)}{post_id}:{content_hash}"
     doc = {
         "post_id": post_id,
         "title": title,
@@ -102,6 +209,7 @@ def index_chunk(post_id: int, title: str, content: str, embedding: list) -> str:
 
 async def text_search_async(keyword: str, top_k: int = 5) -> list:
     """Search for blocks containing exact keywords using Redis FTS (Async)."""
+    from redis.commands.search.query import Query
     client = get_async_redis_client()
     
     # Escape special characters for Redis search
@@ -123,8 +231,12 @@ async def text_search_async(keyword: str, top_k: int = 5) -> list:
         logger.warning('Redis text search error: %s', e)
         return []
 
-async def search_similar_async(query_embedding: list, top_k: int = 5, max_distance: float = 0.7) -> list:
-    """Search for similar chunks using vector similarity (Async)."""
+async def search_similar_async(query_embedding: list, top_k: int = 5, max_distance: float = 0.7, post_ids=None) -> list:
+    """
+    Search for similar chunks using vector similarity (Async). With `post_ids`,
+    KNN runs only over those posts' chunks (pre-filtered, not post-filtered).
+    """
+    from redis.commands.search.query import Query
     client = get_async_redis_client()
 
     def parse_doc(doc):
@@ -139,8 +251,9 @@ async def search_similar_async(query_embedding: list, top_k: int = 5, max_distan
             return None
 
     query_vector = struct.pack(f'{len(query_embedding)}f', *query_embedding)
+    base = "(" + " | ".join(f"@post_id:[{int(pid)} {int(pid)}]" for pid in post_ids) + ")" if post_ids else "*"
     q = (
-        Query(f"*=>[KNN {top_k} @embedding $query_vector AS distance]")
+        Query(f"{base}=>[KNN {top_k} @embedding $query_vector AS distance]")
         .sort_by("distance")
         .return_fields("title", "content", "post_id", "distance")
         .dialect(2)
@@ -155,6 +268,7 @@ async def search_similar_async(query_embedding: list, top_k: int = 5, max_distan
 
 def search_similar(query_embedding: list, top_k: int = 5, max_distance: float = 0.7) -> list:
     """Search for similar chunks using vector similarity (Sync)."""
+    from redis.commands.search.query import Query
     client = get_redis_client()
     if not ensure_index_exists(): return []
     query_vector = struct.pack(f'{len(query_embedding)}f', *query_embedding)
@@ -178,18 +292,78 @@ def search_similar(query_embedding: list, top_k: int = 5, max_distance: float =
     except Exception:
         return []
 
-def delete_post_chunks(post_id: int):
-    """Delete all chunks for a specific post."""
+def ensure_post_index_exists():
+    """Create the post-level index if it doesn't exist (Sync)."""
     client = get_redis_client()
-    cursor = 0
-    deleted = 0
-    while True:
-        cursor, keys = client.scan(cursor, match=f"{DOC_PREFIX}{post_id}:*")
-        for key in keys:
-            client.delete(key)
-            deleted += 1
-        if cursor == 0: break
-    return deleted
+    try:
+        client.ft(POST_INDEX_NAME).info()
+        return True
+    except redis.ResponseError:
+        from redis.commands.search.index_definition import IndexDefinition, IndexType
+        try:
+            definition = IndexDefinition(prefix=[POST_DOC_PREFIX], index_type=IndexType.JSON)
+            client.ft(POST_INDEX_NAME).create_index(get_post_schema(), definition=definition)
+            return True
+        except Exception as e:
+            logger.error('Failed to create Redis post index: %s', e)
+            return False
+
+def post_vector_key(post_id: int) -> str:
+    return f"{POST_DOC_PREFIX}{post_id}"
+
+def post_vector_text(title: str, semantic_summary: str, body: str = "") -> str:
+    """Text embedded for the post-level vector."""
+    about = semantic_summary or re.sub('<[^<]+?>', '', body)[:POST_SOURCE_CHARS]
+    return f"Post: {title}\n{about}".strip()
+
+def has_post_vector(post_id: int) -> bool:
+    return bool(get_redis_client().exists(post_vector_key(post_id)))
+
+def index_post_vector(post_id: int, title: str, embedding: list):
+    """Store (or replace) the post-level vector for one post (Sync)."""
+    client = get_redis_client()
+    ensure_post_index_exists()
+    client.json().set(post_vector_key(post_id), "$", {
+        "post_id": post_id,
+        "title": title,
+        "embedding": embedding,
+    })
+
+def delete_post_vector(post_id: int):
+    get_redis_client().delete(post_vector_key(post_id))
+
+async def search_posts_async(query_embedding: list, top_k: int = 5, max_distance: float = 0.7) -> list:
+    """KNN over post-level vectors (Async). Returns [{'post_id', 'title', 'distance'}] nearest first."""
+    from redis.commands.search.query import Query
+    client = get_async_redis_client()
+    query_vector = struct.pack(f'{len(query_embedding)}f', *query_embedding)
+    q = (
+        Query(f"*=>[KNN {top_k} @embedding $query_vector AS distance]")
+        .sort_by("distance")
+        .return_fields("title", "post_id", "distance")
+        .dialect(2)
+    )
+    try:
+        results = await client.ft(POST_INDEX_NAME).search(q, query_params={"query_vector": query_vector})
+    except Exception as e:
+        logger.warning('Async Redis post search error: %s', e)
+        return []
+    hits = []
+    for doc in results.docs:
+        try:
+            hit = {"post_id": int(doc.post_id), "title": getattr(doc, 'title', ""), "distance": float(doc.distance)}
+        except (ValueError, AttributeError):
+            continue
+        if hit['distance'] < max_distance:
+            hits.append(hit)
+    return hits
+
+def delete_post_chunks(post_id: int, version: int | None = None):
+    """Delete all chunks for a specific post (in the live index version by default)."""
+    client = get_redis_client()
+    if version is None:
+        version = get_live_version(client) or 0
+    return _delete_by_prefix(client, f"{version_doc_prefix(version)}{post_id}:")
 
 def get_chunk_count() -> int:
     """Get total number of indexed chunks."""
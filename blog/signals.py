@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Post
+from .models import Post, Comment
+from .page_cache import bump_global_generation, bump_post_generation
+from .images import needs_variants, run_image_variants
+from .summaries import needs_summary, run_summaries
 import threading
 from django.core.management import call_command
 
@@ -23,3 +26,28 @@ def reindex_on_save(sender, instance, **kwargs):
         # Use a simple thread for background processing to avoid blocking the request
         # In a larger app, this would be Celery or RQ.
         threading.Thread(target=run_indexing, args=(instance.id,), daemon=True).start()
+
+
+@receiver(post_save, sender=Post)
+def summarize_on_save(sender, instance, **kwargs):
+    """Write the semantic summary off the request thread; indexing never waits on it."""
+    if instance.status == 'published' and needs_summary(instance):
+        threading.Thread(target=run_summaries, args=(instance.id,), daemon=True).start()
+
+@receiver(post_save, sender=Post)
+def build_image_variants_on_save(sender, instance, **kwargs):
+    """Resize a newly uploaded featured image off the request thread."""
+    if needs_variants(instance):
+        threading.Thread(target=run_image_variants, args=(instance.id,), daemon=True).start()
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_pages_on_post_change(sender, instance, **kwargs):
+    """Any post change can show up on listings and other posts' pages."""
+    bump_global_generation()
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_post_page_on_comment_change(sender, instance, **kwargs):
+    """Comments only render on their own post's page."""
+    slug = Post.objects.filter(pk=instance.post_id).values_list('slug', flat=True).first()
+    if slug:
+        bump_post_generation(slug)
@@ -1,10 +1,153 @@
+import hashlib
+from xml.sax.saxutils import escape
+
 from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.urls import reverse
 from .models import Post
+from .async_cache import async_cache
+from .page_cache import get_generations
+
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24  # the global generation does the invalidation
+SITEMAP_CHUNK_SIZE = 200  # rows per DB fetch and per streamed write
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
 class PostSitemap(Sitemap):
     changefreq = 'daily' # 'always', 'hourly', 'daily', 'weekly', 'monthly', 'yearly', 'never'
     priority = 0.9
+    limit = 1000  # URLs per sitemap page
 
     def items(self):
-        return Post.published.all()
+        # Only what a <url> entry needs — never load post bodies for crawlers.
+        return Post.published.only('slug', 'updated').order_by('id')
     def lastmod(self, obj):
         return obj.updated
+
+
+SITEMAPS = {
+    'posts': PostSitemap,
+}
+
+
+def _cache_key(name: str) -> str | None:
+    """Key under the current global generation, or None when it can't be read (nothing is cached then)."""
+    generation = get_generations()[0]
+    return f"sitemap:{name}:{generation}" if generation else None
+
+
+def _base_url(request, sitemap: Sitemap) -> str:
+    protocol = sitemap.get_protocol(request.scheme)
+    return f"{protocol}://{sitemap.get_domain(get_current_site(request))}"
+
+
+def render_index(request) -> str:
+    """Sitemap index listing every page of every section (cached per generation)."""
+    key = _cache_key('index')
+    xml = cache.get(key) if key else None
+    if xml is not None:
+        return xml
+
+    lines = [XML_HEADER, '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for section, sitemap_class in SITEMAPS.items():
+        sitemap = sitemap_class()
+        base = _base_url(request, sitemap)
+        location = reverse('sitemap_section', kwargs={'section': section})
+        for page in sitemap.paginator.page_range:
+            suffix = f"?p={page}" if page > 1 else ""
+            lines.append(f"<sitemap><loc>{escape(base + location + suffix)}</loc></sitemap>\n")
+    lines.append('</sitemapindex>\n')
+
+    xml = ''.join(lines)
+    if key:
+        cache.set(key, xml, timeout=SITEMAP_CACHE_TIMEOUT)
+    return xml
+
+
+def get_cached_section(section: str, page: int) -> str | None:
+    key = _cache_key(f"{section}:{page}")
+    return cache.get(key) if key else None
+
+
+def stream_section(request, section: str, page: int):
+    """
+    Yield one sitemap page as XML chunks straight from a narrow DB iterator,
+    then cache the assembled page. Returns None for an unknown section/page.
+    The generator is async so ASGI streams it instead of buffering it whole.
+    """
+    sitemap_class = SITEMAPS.get(section)
+    if sitemap_class is None or page < 1:
+        return None
+    sitemap = sitemap_class()
+    offset = (page - 1) * sitemap.limit
+    if page > 1 and offset >= sitemap.paginator.count:
+        return None
+
+    key = _cache_key(f"{section}:{page}")
+    base = _base_url(request, sitemap)
+    items = sitemap.items()[offset:offset + sitemap.limit]
+
+    async def generate():
+        parts = [XML_HEADER, '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+        yield ''.join(parts)
+        batch = []
+        async for obj in items.aiterator(chunk_size=SITEMAP_CHUNK_SIZE):
+            entry = [f"<url><loc>{escape(base + obj.get_absolute_url())}</loc>"]
+            lastmod = sitemap.lastmod(obj)
+            if lastmod:
+                entry.append(f"<lastmod>{lastmod.date().isoformat()}</lastmod>")
+            entry.append(f"<changefreq>{sitemap.changefreq}</changefreq>")
+            entry.append(f"<priority>{sitemap.priority}</priority></url>\n")
+            batch.append(''.join(entry))
+            if len(batch) >= SITEMAP_CHUNK_SIZE:
+                chunk = ''.join(batch)
+                parts.append(chunk)
+                batch = []
+                yield chunk
+        batch.append('</urlset>\n')
+        chunk = ''.join(batch)
+        parts.append(chunk)
+        yield chunk
+        if key:
+            await async_cache.set(key, ''.join(parts), timeout=SITEMAP_CACHE_TIMEOUT)
+
+    return generate()
+
+
+# ─── Conditional GET validators (used with django.views.decorators.http.condition) ──
+
+def _validators(request) -> tuple:
+    """
+    (etag, last_modified), computed once per request. With the global
+    generation readable, both come from the cache — the newest `updated` is
+    stored under the same generation as the XML. Without it (Redis down or the
+    counter evicted) they come from the database, so a 304 is never answered
+    for content that changed.
+    """
+    if not hasattr(request, '_sitemap_validators'):
+        generation = get_generations()[0]
+        key = f"sitemap:lastmod:{generation}"
+        stamps = cache.get(key) if generation else None
+        if stamps is None:
+            stamps = Post.published.aggregate(latest=Max('updated'), count=Count('id'))
+            if generation:
+                cache.set(key, stamps, timeout=SITEMAP_CACHE_TIMEOUT)
+        if generation:
+            etag = f"sitemap-{generation}"
+        else:
+            # Max(updated) alone would miss deletions.
+            latest = stamps['latest'].isoformat() if stamps['latest'] else ''
+            digest = hashlib.md5(f"{latest}:{stamps['count']}".encode()).hexdigest()[:16]
+            etag = f"sitemap-db-{digest}"
+        request._sitemap_validators = (etag, stamps['latest'])
+    return request._sitemap_validators
+
+
+def sitemap_etag(request, *args, **kwargs):
+    return _validators(request)[0]
+
+def sitemap_last_modified(request, *args, **kwargs):
+    return _validators(request)[1]
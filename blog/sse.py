@@ -0,0 +1,101 @@
+"""
+Coalesced Server-Sent Events framing for chat streams.
+
+The model server emits a delta per token or two; forwarding each as its own
+event costs a json.dumps, an ASGI send and a TCP write per token.
+`coalesce_deltas` re-chunks the stream: the first delta goes out at once
+(time to first token is what users perceive), later ones are joined until
+AI_STREAM_FLUSH_INTERVAL passes or AI_STREAM_FLUSH_BYTES accumulate, and a
+pause upstream still flushes on time. One producer task drives the upstream
+iterator, so the timeouts and connection scopes inside it stay in one task.
+"""
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class EventWriter:
+    """Formats `data:` events and counts what the stream sent."""
+
+    def __init__(self):
+        self.events = 0
+        self.bytes = 0
+
+    def __call__(self, payload: dict) -> str:
+        frame = f"data: {json.dumps(payload)}\n\n"
+        self.events += 1
+        self.bytes += len(frame.encode())
+        return frame
+
+
+def _content_chunk(parts: list) -> dict:
+    return {"message": {"content": ''.join(parts)}, "done": False}
+
+
+async def coalesce_deltas(chunks, flush_interval: float, max_bytes: int):
+    """
+    Re-chunk an async iterator of chat chunks ({'message': {'content'}, 'done'})
+    into fewer, larger content chunks of the same shape. Non-content chunks
+    (e.g. the final `done` one) flush what is pending and pass through.
+    """
+    queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                queue.put_nowait(chunk)
+            queue.put_nowait(_END)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    producer = asyncio.create_task(produce())
+    loop = asyncio.get_running_loop()
+    pending, size, deadline, first = [], 0, 0.0, True
+    try:
+        while True:
+            timeout = max(0.0, deadline - loop.time()) if pending else None
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield _content_chunk(pending)
+                pending, size = [], 0
+                continue
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            content = '' if item.get('done') else item.get('message', {}).get('content', '')
+            if not content:
+                if pending:
+                    yield _content_chunk(pending)
+                    pending, size = [], 0
+                yield item
+            elif first:
+                first = False
+                yield item
+            else:
+                if not pending:
+                    deadline = loop.time() + flush_interval
+                pending.append(content)
+                size += len(content.encode())
+                if size >= max_bytes:
+                    yield _content_chunk(pending)
+                    pending, size = [], 0
+        if pending:
+            yield _content_chunk(pending)
+    finally:
+        producer.cancel()
+        # Let the cancellation land before closing the upstream: aclose() on a
+        # generator another task is still driving raises instead of closing it.
+        await asyncio.gather(producer, return_exceptions=True)
+        aclose = getattr(chunks, 'aclose', None)
+        if aclose is not None:
+            try:
+                await aclose()  # releases the model's HTTP stream
+            except Exception as e:
+                logger.warning(f"Upstream chat stream did not close cleanly: {e}")
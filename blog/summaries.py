@@ -0,0 +1,103 @@
+"""
+Semantic summaries for posts, as a stage separate from embedding indexing.
+
+Summaries are written by the completion model, which is the slowest part of
+ingesting a post, so they run in the background with a bounded number of
+concurrent requests. Each summary records the md5 of the body it was written
+from; unchanged posts are never re-summarized. Results are stored with a
+queryset update() — no save signals, no reindexing — and the post-level
+vector (title + summary, see redis_vectors) is refreshed from the new summary.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SOURCE_CHARS = 3000
+
+
+def body_hash(body: str) -> str:
+    return hashlib.md5(body.encode()).hexdigest()
+
+
+def needs_summary(post) -> bool:
+    """True when the post has no summary, or one written from an older body."""
+    return not post.semantic_summary or post.semantic_summary_hash != body_hash(post.body)
+
+
+async def _summarize(post, client) -> str:
+    text = re.sub('<[^<]+?>', '', post.body)[:SUMMARY_SOURCE_CHARS]
+    prompt = f"Summarize the technical core of this post in 3 sentences for an AI knowledge base:\n\n{text}"
+    resp = await client.generate(model=None, prompt=prompt)
+    return resp['response'].strip()
+
+
+async def _refresh_post_vector(post, summary: str, client):
+    from .redis_vectors import index_post_vector, post_vector_text
+    try:
+        emb_resp = await client.embeddings(model=None, prompt=post_vector_text(post.title, summary))
+        await sync_to_async(index_post_vector)(post.pk, post.title, emb_resp['embedding'])
+    except Exception as e:
+        logger.warning(f"Post vector refresh failed for post {post.pk}: {e}")
+
+
+async def generate_summaries(post_ids=None, force: bool = False, concurrency: int | None = None, on_result=None) -> dict:
+    """
+    Summarize published posts (or just `post_ids`) that need it, at most
+    `concurrency` at a time. `on_result(post, error)` is called per post.
+    Returns counts: {'summarized': n, 'skipped': n, 'failed': n}.
+    """
+    from .ai_utils import new_ai_client
+    from .models import Post
+
+    semaphore = asyncio.Semaphore(concurrency or settings.AI_POST_SUMMARY_CONCURRENCY)
+    counts = {'summarized': 0, 'skipped': 0, 'failed': 0}
+
+    qs = Post.published.only('id', 'title', 'body', 'semantic_summary', 'semantic_summary_hash')
+    if post_ids is not None:
+        qs = qs.filter(pk__in=post_ids)
+    posts = [post async for post in qs]
+
+    async def run(post):
+        async with semaphore:
+            content_hash = body_hash(post.body)
+            try:
+                summary = await _summarize(post, client)
+                # Guard on the body we summarized: an edit in the meantime gets its own run.
+                updated = await Post.objects.filter(pk=post.pk, body=post.body).aupdate(
+                    semantic_summary=summary, semantic_summary_hash=content_hash,
+                )
+                if updated:
+                    await _refresh_post_vector(post, summary, client)
+                counts['summarized'] += 1
+                error = None
+            except Exception as e:
+                counts['failed'] += 1
+                error = e
+            if on_result:
+                on_result(post, error)
+
+    pending = [post for post in posts if force or needs_summary(post)]
+    counts['skipped'] = len(posts) - len(pending)
+    # Callers run this on a short-lived loop (async_to_sync in a signal thread
+    # or command), so it gets its own transport rather than the worker's pool.
+    client = new_ai_client()
+    try:
+        await asyncio.gather(*(run(post) for post in pending))
+    finally:
+        await client.aclose()
+    return counts
+
+
+def run_summaries(post_id: int):
+    """Background entry point used by the post_save signal."""
+    from asgiref.sync import async_to_sync
+    try:
+        async_to_sync(generate_summaries)([post_id])
+    except Exception as e:
+        logger.error(f"Semantic summary failed for post {post_id}: {e}")
@@ -0,0 +1,30 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from blog.assets import PRELOAD_FONTS, bundle_files, bundle_path
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset_bundle(name):
+    """<link>/<script> tags for a bundle (its source files when DEBUG is on)."""
+    urls = ((static(path),) for path in bundle_files(name))
+    if name.endswith('.css'):
+        return format_html_join('\n', '<link href="{}" rel="stylesheet">', urls)
+    return format_html_join('\n', '<script src="{}"></script>', urls)
+
+
+@register.simple_tag
+def asset_preload():
+    """Preload what the parser discovers late: the web font (via CSS) and the JS bundle."""
+    fonts = format_html_join(
+        '\n', '<link rel="preload" href="{}" as="font" type="font/woff2" crossorigin>',
+        ((static(path),) for path in PRELOAD_FONTS),
+    )
+    scripts = format_html_join(
+        '\n', '<link rel="preload" href="{}" as="script">',
+        ((static(path),) for path in bundle_files('site.js') if path == bundle_path('site.js')),
+    )
+    return fonts + scripts
@@ -0,0 +1,41 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+FORMAT_TYPES = (('avif', 'image/avif'), ('webp', 'image/webp'))
+
+
+def _srcset(entries) -> str:
+    return ', '.join(f"{default_storage.url(e['name'])} {e['width']}w" for e in entries)
+
+
+@register.simple_tag
+def responsive_image(post, sizes='100vw', css_class='', style='', alt=None, loading='lazy'):
+    """
+    <picture> for Post.image with AVIF/WebP srcsets and intrinsic width/height
+    (prevents layout shift). Falls back to the original until derivatives exist.
+
+        {% responsive_image post sizes="(min-width: 768px) 33vw, 100vw" css_class="..." %}
+    """
+    if not post.image:
+        return ''
+    variants = post.image_variants or {}
+    alt = post.title if alt is None else alt
+
+    size_attrs = ''
+    if post.image_width and post.image_height:
+        size_attrs = format_html(' width="{}" height="{}"', post.image_width, post.image_height)
+    img = format_html(
+        '<img src="{}" class="{}" style="{}" alt="{}" loading="{}" decoding="async"{}>',
+        post.image.url, css_class, style, alt, loading, size_attrs,
+    )
+
+    if variants.get('source') != post.image.name:
+        return img
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, _srcset(variants[fmt]), sizes) for fmt, mime in FORMAT_TYPES if variants.get(fmt)),
+    )
+    return format_html('<picture>{}{}</picture>', sources, img)
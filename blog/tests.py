@@ -0,0 +1,339 @@
+import asyncio
+import functools
+import json
+import threading
+import traceback
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .benchmarking import (
+    BOOT_IMPORT_BUDGET_MS, LAZY_MODULES, QUERY_BUDGETS, FakeAIClient, FakeVectorBackend, boot_worker,
+    cold_cache,
+)
+from .models import Comment, Post
+from .views import POSTS_PER_PAGE
+from .summaries import body_hash, run_summaries
+
+
+class _KeepAliveAIHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible stub that keeps connections open between requests."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        if self.path.endswith('/embeddings'):
+            payload = {
+                'object': 'list', 'model': 'stub',
+                'data': [{'object': 'embedding', 'index': 0, 'embedding': [0.0] * 8}],
+                'usage': {'prompt_tokens': 1, 'total_tokens': 1},
+            }
+        else:
+            payload = {
+                'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': 'A stub summary.'}}],
+            }
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RunSummariesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveAIHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        author = User.objects.create(username='author')
+        with mock.patch('blog.signals.threading'):  # no background indexing or summaries
+            self.post = Post.objects.create(
+                title='Pooling', slug='pooling', author=author, body='First body ' * 20, status='published',
+            )
+
+    def test_back_to_back_runs_each_write_a_summary(self):
+        """Each run is its own event loop; a keep-alive connection must not leak into the next."""
+        host = f"http://127.0.0.1:{self.server.server_address[1]}"
+        with override_settings(AI_HOST=host), mock.patch('blog.redis_vectors.index_post_vector'):
+            run_summaries(self.post.pk)
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.semantic_summary_hash, body_hash(self.post.body))
+
+            Post.objects.filter(pk=self.post.pk).update(body='Second body ' * 20)
+            run_summaries(self.post.pk)
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.semantic_summary, 'A stub summary.')
+            self.assertEqual(self.post.semantic_summary_hash, body_hash('Second body ' * 20))
+
+
+class PostSaveTests(TestCase):
+    def test_full_save_keeps_variants_written_in_the_background(self):
+        author = User.objects.create(username='author')
+        with mock.patch('blog.signals.threading'):
+            Post.objects.create(title='Post', slug='post', author=author, body='Body', image='featured_image/a.jpg')
+            post = Post.objects.get(slug='post')  # e.g. the admin change form
+            variants = {'source': 'featured_image/a.jpg', 'width': 800, 'height': 600}
+            Post.objects.filter(pk=post.pk).update(image_width=800, image_height=600, image_variants=variants)
+            post.title = 'Edited'
+            post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.title, 'Edited')
+        self.assertEqual((post.image_width, post.image_variants), (800, variants))
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        author = User.objects.create(username='author')
+        with mock.patch('blog.signals.threading'):
+            for i in range(POSTS_PER_PAGE + 1):
+                Post.objects.create(
+                    title=f'Post {i}', slug=f'post-{i}', author=author, body='Body', status='published',
+                )
+
+    def assertPageCache(self, url, expected):
+        self.assertEqual(self.client.get(url).get('X-Page-Cache'), expected, url)
+
+    def test_equivalent_urls_share_one_entry(self):
+        self.assertPageCache('/', 'MISS')
+        self.assertPageCache('/?page=1', 'HIT')
+        self.assertPageCache('/?page=2', 'MISS')
+        self.assertPageCache('/?page=2', 'HIT')
+
+    def test_arbitrary_query_strings_are_not_stored(self):
+        for url in ('/?x=1', '/?page=1&x=1', '/?page=abc', '/?page=01'):
+            self.assertPageCache(url, None)
+            self.assertPageCache(url, None)
+
+    def test_unknown_tags_and_out_of_range_pages_are_not_stored(self):
+        for url in ('/tag/no-such-tag/', '/?page=99'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.get('X-Page-Cache'))
+            self.assertPageCache(url, None)
+
+    def test_etag_ignores_equivalent_spellings(self):
+        etag = self.client.get('/').headers['ETag']
+        self.assertEqual(self.client.get('/?page=1').headers['ETag'], etag)
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_sitemap_validators_fall_back_to_the_database(self):
+        from django.core.cache import cache
+        from .page_cache import GLOBAL_GENERATION_KEY
+
+        cache.delete(GLOBAL_GENERATION_KEY)  # evicted, or Redis down behind IGNORE_EXCEPTIONS
+        etag = self.client.get('/sitemap.xml').headers['ETag']
+        self.assertEqual(self.client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Post.objects.filter(slug='post-0').delete()
+        cache.delete(GLOBAL_GENERATION_KEY)
+        self.assertEqual(self.client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+def _app_caller() -> str:
+    """Innermost stack frame in app code (not this file), i.e. who made the blocking call."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if '/blog/' in frame.filename and not frame.filename.endswith('tests.py'):
+            return f"{frame.filename}:{frame.lineno} ({frame.name})"
+    return 'unknown'
+
+
+class BlockingCallDetector:
+    """Records synchronous cache/Redis calls made on a thread running an event loop."""
+
+    def __init__(self):
+        self.calls = []
+        self._patches = []
+
+    def guard(self, owner, name):
+        original = getattr(owner, name)
+        detector = self
+
+        @functools.wraps(original)
+        def guarded(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                pass  # worker thread (sync_to_async) — allowed
+            else:
+                detector.calls.append(f"{owner.__name__}.{name} from {_app_caller()}")
+            return original(*args, **kwargs)
+
+        patcher = mock.patch.object(owner, name, guarded)
+        patcher.start()
+        self._patches.append(patcher)
+
+    def __enter__(self):
+        import redis
+        from django.core.cache import caches
+
+        backend = type(caches['default'])
+        for name in ('get', 'set', 'add', 'delete', 'get_many', 'set_many', 'incr', 'has_key'):
+            self.guard(backend, name)
+        self.guard(redis.Redis, 'execute_command')
+        return self
+
+    def __exit__(self, *exc):
+        for patcher in reversed(self._patches):
+            patcher.stop()
+
+
+class EventLoopBlockingTests(TestCase):
+    """The async chat/RAG path must not make blocking cache or Redis calls on the event loop."""
+    message = 'How is the page cache invalidated?'
+
+    async def _chat(self, client):
+        response = await client.post(
+            reverse('blog:chat_api'), data=json.dumps({'message': self.message}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        async for _chunk in response.streaming_content:
+            pass
+
+    async def test_chat_and_rag_make_no_blocking_calls(self):
+        from .ai_utils import generate_rag_context
+
+        fake = FakeAIClient()
+        client = AsyncClient()
+        with BlockingCallDetector() as detector, mock.patch('blog.views.get_ai_client', return_value=fake):
+            for _ in range(2):  # cold caches, then warm ones
+                await generate_rag_context(self.message, fake)
+                await self._chat(client)
+        self.assertEqual(detector.calls, [])
+
+    async def test_detector_catches_sync_cache_calls(self):
+        from django.core.cache import caches
+
+        cache = caches['default']
+        with BlockingCallDetector() as detector:
+            cache.set('blocking', 1)
+            cache.get('blocking')
+        backend = type(cache).__name__
+        flagged = {call.split(' from ')[0] for call in detector.calls}
+        self.assertLessEqual({f"{backend}.set", f"{backend}.get"}, flagged)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ViewQueryBudgetTests(TestCase):
+    """SQL statements per view must match QUERY_BUDGETS (cold caches, then a page-cache hit)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author')
+        with mock.patch('blog.signals.threading'):
+            posts = [
+                Post.objects.create(
+                    title=f'Python cache tuning {i}', slug=f'python-cache-{i}', author=author,
+                    body='## Redis\n\nBody text.', status='published',
+                )
+                for i in range(POSTS_PER_PAGE + 2)
+            ]
+        for post in posts:
+            post.tags.add('python', 'redis')
+        cls.post = posts[1]
+        Comment.objects.create(post=cls.post, name='A', email='a@example.com', body='Root')
+        cls.deep = posts[0]
+        parent = None
+        for depth in range(6):
+            parent = Comment.objects.create(
+                post=cls.deep, parent=parent, name='B', email='b@example.com', body=f'Reply {depth}',
+            )
+        cls.post_ids = [p.id for p in posts]
+
+    def setUp(self):
+        from django.contrib.sites.models import Site
+        Site.objects.get_current()  # memoised per process after the first request, like in production
+
+        async def allow(policy, request):
+            return 0
+
+        async def no_log(kind, text):
+            pass
+
+        vectors = FakeVectorBackend(self.post_ids)
+        for target, value in (
+            ('blog.views.get_ai_client', mock.Mock(return_value=FakeAIClient())),
+            ('blog.views.get_cached_embedding_async', vectors.get_cached_embedding),
+            ('blog.views.cache_embedding_async', vectors.cache_embedding),
+            ('blog.views.search_posts_async', vectors.search_posts),
+            ('blog.views.log_query', no_log),
+            ('blog.ratelimit.acheck_rate_limit', allow),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, path):
+        response = self.client.get(path, secure=True)
+        if response.streaming:
+            with warnings.catch_warnings():
+                # The sitemap streams asynchronously; the sync test client drains it.
+                warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume asynchronous')
+                b''.join(response)
+        self.assertEqual(response.status_code, 200, path)
+
+    def test_query_budgets(self):
+        scenarios = {
+            'post_list': reverse('blog:post_list'),
+            'post_list_page': reverse('blog:post_list') + '?page=2',
+            'post_list_tag': reverse('blog:post_tag', args=['python']),
+            'post_list_search': reverse('blog:post_list') + '?q=redis+cache',
+            'post_detail': self.post.get_absolute_url(),
+            'post_detail_deep': self.deep.get_absolute_url(),
+            'search_live': reverse('blog:search_live') + '?q=python',
+            'search_live_neural': reverse('blog:search_live') + '?q=qzxv+wkpf',
+            'sitemap_index': reverse('sitemap_index'),
+            'sitemap_section': reverse('sitemap_section', kwargs={'section': 'posts'}),
+        }
+        self.assertEqual(set(scenarios), set(QUERY_BUDGETS))
+        for name, path in scenarios.items():
+            cold, warm = QUERY_BUDGETS[name]
+            with self.subTest(name, state='cold'):
+                cold_cache()
+                with self.assertNumQueries(cold):
+                    self.get(path)
+            if warm is not None:
+                with self.subTest(name, state='warm'):
+                    with self.assertNumQueries(warm):
+                        self.get(path)
+
+
+class StartupImportTests(SimpleTestCase):
+    """Worker boot (import iooding.asgi, then the URLconf) in a fresh interpreter."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.boot = boot_worker(settings.BASE_DIR)
+
+    def test_import_time_within_budget(self):
+        self.assertLessEqual(
+            self.boot['import_ms'], BOOT_IMPORT_BUDGET_MS,
+            f"slowest packages: {self.boot['packages'][:8]}",
+        )
+
+    def test_heavy_dependencies_are_not_imported_at_boot(self):
+        self.assertEqual(self.boot['eager'], [], f"should load on first use: {LAZY_MODULES}")
@@ -0,0 +1,7 @@
+"""Model-agnostic token estimates for prompt budgeting (history, RAG context)."""
+
+CHARS_PER_TOKEN = 4  # rough; only used for budgeting
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
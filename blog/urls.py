@@ -8,6 +8,7 @@ app_name = 'blog'
 urlpatterns = [
     path('', views.post_list, name='post_list'),
     path('comment/reply/', views.reply_page, name='reply'),
+    path('comment/form/<int:post_id>/', views.comment_form_partial, name='comment_form'),
     path('tag/<slug:tag_slug>/', views.post_list, name='post_tag'),
     path('privacy/', cache_page(86400)(views.privacy), name='privacy'),
     path('terms/', cache_page(86400)(views.terms), name='terms'),
@@ -15,6 +16,8 @@ urlpatterns = [
     path('games/', cache_page(86400)(views.games), name='games'),
     path('api/chat/', views.chat_api, name='chat_api'),
     path('api/chat/status/', views.ai_status, name='ai_status'),
+    path('api/chat/prefetch/', views.chat_prefetch, name='chat_prefetch'),
+    path('api/chat/stream/<str:stream_id>/', views.chat_stream, name='chat_stream'),
     path('search/live/', views.search_live, name='search_live'),
     # Note: health/ is also registered at root level in iooding/urls.py
     path('<slug:post>/', views.post_detail, name='post_detail'),
@@ -1,41 +1,111 @@
 import json
 import hashlib
 import logging
+from collections import defaultdict
 
-from django.db import connections
-from django.db.models import Count, Q
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.http import HttpResponse, StreamingHttpResponse
-from django.views.decorators.http import require_POST
-from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_POST, require_GET
+from django.views.decorators.cache import never_cache
+from django.template.loader import render_to_string
+from django.utils import timezone
 from django.contrib.postgres.search import TrigramSimilarity
 from taggit.models import Tag
 
 from .models import Post
 from .forms import CommentForm
+from .async_cache import async_cache
+from .chat_streams import (
+    STREAM_ID_RE,
+    claim_generation,
+    new_stream_id,
+    parse_last_event_id,
+    read_stream,
+    request_cancel,
+    start_generation,
+    stream_exists,
+)
+from .circuit_breaker import CircuitOpenError
+from .conversations import append_turn, load_conversation, prompt_history
+from .health import get_snapshot as get_health_snapshot, is_ready, local_readiness
+from .page_cache import cache_anonymous_page, skip_page_cache
+from .query_log import canonical_query, log_query
+from .ratelimit import rate_limit
+from .sitemaps import (
+    get_cached_section,
+    render_index,
+    sitemap_etag,
+    sitemap_last_modified,
+    stream_section,
+)
+from .sse import EventWriter, coalesce_deltas
 from .ai_utils import (
+    build_chat_messages,
     check_ai_status,
     generate_rag_context,
     get_ai_client,
-    get_rag_system_prompt,
+    get_site_inventory,
+    prefetch_rag_context,
 )
-from .redis_vectors import search_similar_async, get_cached_embedding_async, cache_embedding_async
+from .redis_vectors import search_posts_async, get_cached_embedding_async, cache_embedding_async
 
 logger = logging.getLogger(__name__)
 
 POSTS_PER_PAGE = 10
 
-def post_list(request, tag_slug=None):
+def _latest(*stamps):
+    """Newest of the given timestamps, never in the future (scheduled posts)."""
+    stamps = [s for s in stamps if s]
+    return min(max(stamps), timezone.now()) if stamps else None
+
+async def post_list_last_modified(request, tag_slug=None):
+    stamps = await Post.published.aaggregate(updated=Max('updated'), publish=Max('publish'))
+    return _latest(stamps['updated'], stamps['publish'])
+
+async def post_detail_last_modified(request, post):
+    stamps = await Post.published.filter(slug=post).aaggregate(
+        updated=Max('updated'), commented=Max('comments__updated'),
+    )
+    return _latest(stamps['updated'], stamps['commented'])
+
+async def _render(request, template_name, context):
+    """
+    Render off the event loop: fragment-cache lookups and markdown are blocking.
+    Context must be fully evaluated — templates run outside the async ORM.
+    """
+    content = await sync_to_async(render_to_string, thread_sensitive=False)(template_name, context, request)
+    return HttpResponse(content)
+
+async def _comment_tree(post):
+    """All active comments in one query, linked as `children` — returns the roots."""
+    comments = [
+        c async for c in post.comments.filter(active=True).select_related('parent').order_by('created')
+    ]
+    children = defaultdict(list)
+    for comment in comments:
+        children[comment.parent_id].append(comment)
+    for comment in comments:
+        comment.children = children.get(comment.id, [])
+    return children[None]
+
+@cache_anonymous_page(last_modified_func=post_list_last_modified, paginated=True)
+async def post_list(request, tag_slug=None):
     posts = Post.published.select_related('author').prefetch_related('tags')
     tag = None
+    cacheable = True  # unknown tags and out-of-range pages render, but aren't stored
 
     if tag_slug:
-        tag = Tag.objects.filter(slug=tag_slug).first()
+        tag = await Tag.objects.filter(slug=tag_slug).afirst()
         if tag:
             posts = posts.filter(tags__in=[tag])
         else:
             posts = posts.none()
+            cacheable = False
             tag = {'name': tag_slug.replace('-', ' ').title(), 'slug': tag_slug}
 
     query = request.GET.get('q', '').strip()
@@ -50,6 +120,7 @@ def post_list(request, tag_slug=None):
         ).order_by('-similarity', '-publish').distinct()
 
     paginator = Paginator(posts, POSTS_PER_PAGE)
+    paginator.count = await posts.acount()  # prime the cached_property without a sync query
     page = request.GET.get('page')
     try:
         posts = paginator.page(page)
@@ -57,66 +128,68 @@ def post_list(request, tag_slug=None):
         posts = paginator.page(1)
     except EmptyPage:
         posts = paginator.page(paginator.num_pages)
+        cacheable = False
+    posts.object_list = [p async for p in posts.object_list]
 
-    return render(request, 'blog/post_list.html', {
+    response = await _render(request, 'blog/post_list.html', {
         'posts': posts,
         'tag': tag,
         'query': query,
     })
+    return response if cacheable else skip_page_cache(response)
 
-def get_client_ip(request):
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        return x_forwarded_for.split(',')[0].strip()
-    return request.META.get('REMOTE_ADDR')
-
-def post_detail(request, post):
-    post = get_object_or_404(
+@rate_limit('comment', methods=('POST',))
+@cache_anonymous_page(slug_kwarg='post', last_modified_func=post_detail_last_modified)
+async def post_detail(request, post):
+    post = await aget_object_or_404(
         Post.published.select_related('author').prefetch_related('tags'),
         slug=post,
     )
-    comments = post.comments.filter(active=True, parent=None).select_related()
-    comment_form = CommentForm()
+    # Only a bound (invalid) form is rendered inline; GETs load it via HTMX.
+    comment_form = None
 
     if request.method == 'POST':
-        ip = get_client_ip(request)
-        cache_key = f"comment_rate:{ip}"
-        if cache.get(cache_key):
-            return HttpResponse('Rate limit exceeded. Please wait 10s.', status=429)
-        cache.set(cache_key, True, timeout=10)
-
         comment_form = CommentForm(data=request.POST)
         if comment_form.is_valid():
             new_comment = comment_form.save(commit=False)
             new_comment.post = post
-            new_comment.save()
+            await new_comment.asave()
             return redirect(post.get_absolute_url() + '#' + str(new_comment.id))
 
-    post_tags_ids = post.tags.values_list('id', flat=True)
-    similar_posts = (
-        Post.published
+    comments = await _comment_tree(post)
+    post_tags_ids = [t.id for t in post.tags.all()]  # prefetched
+    similar_posts = [
+        p async for p in Post.published
         .filter(tags__in=post_tags_ids)
         .exclude(id=post.id)
         .annotate(same_tags=Count('tags'))
         .order_by('-same_tags', '-publish').distinct()[:6]
-    )
+    ]
 
-    return render(request, 'blog/post_detail.html', {
+    return await _render(request, 'blog/post_detail.html', {
         'post': post,
         'comments': comments,
         'comment_form': comment_form,
         'similar_posts': similar_posts,
     })
 
-@require_POST
-def reply_page(request):
-    ip = get_client_ip(request)
-    cache_key = f"comment_rate:{ip}"
-    if cache.get(cache_key):
-        return HttpResponse('Rate limit exceeded. Please wait 10s.', status=429)
-    
-    cache.set(cache_key, True, timeout=10)
+@never_cache
+@require_GET
+def comment_form_partial(request, post_id):
+    """
+    HTMX fragment carrying the CSRF-bearing comment form.
+    Kept out of post_detail so the page itself stays cacheable.
+    """
+    post = get_object_or_404(Post.published.only('id', 'slug', 'publish'), id=post_id)
+    return render(request, 'blog/partials/comment_form.html', {
+        'post': post,
+        'parent_id': request.GET.get('parent', ''),
+        'comment_form': CommentForm(),
+    })
 
+@require_POST
+@rate_limit('comment')
+async def reply_page(request):
     form = CommentForm(request.POST)
     if form.is_valid():
         post_id = request.POST.get('post_id')
@@ -131,22 +204,33 @@ def reply_page(request):
         reply.post_id = int(post_id)
         if parent_id:
             reply.parent_id = int(parent_id)
-        reply.save()
+        await reply.asave()
         return redirect(post_url + '#' + str(reply.id))
     
     logger.warning(f"Comment form invalid: {form.errors}")
     return HttpResponse(f"Form is invalid: {form.errors}", status=400)
 
-def health_check(request):
-    try:
-        with connections['default'].cursor() as cursor:
-            cursor.execute("SELECT 1")
-        return HttpResponse('ok', content_type='text/plain')
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return HttpResponse('Service Unavailable', status=503, content_type='text/plain')
+async def health_check(request):
+    """Liveness: the worker's event loop is answering. Dependencies are readiness."""
+    return HttpResponse('ok', content_type='text/plain')
+
+async def health_ready(request):
+    """Readiness: this worker can reach Postgres. The shared snapshot only drives chat status."""
+    status = await local_readiness()
+    if not is_ready(status):
+        logger.error(f"Readiness check failed: {status['database'].get('error')}")
+    return HttpResponse(
+        json.dumps(status),
+        status=200 if is_ready(status) else 503,
+        content_type='application/json',
+    )
 
 async def ai_status(request):
+    snapshot = await get_health_snapshot()
+    if snapshot is not None:
+        # This worker's circuit breaker may know about failures newer than the snapshot.
+        is_online = snapshot.get('ai', {}).get('ok', False) and get_ai_client().available
+        return HttpResponse(json.dumps({'online': is_online}), content_type='application/json')
     try:
         is_online = await check_ai_status()
         return HttpResponse(
@@ -161,6 +245,14 @@ async def ai_status(request):
             status=200,
         )
 
+def _sse_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-cache, no-transform'
+    response['Content-Encoding'] = 'identity'
+    return response
+
+@rate_limit('chat', methods=('POST',))
 async def chat_api(request):
     if request.method != 'POST':
         return HttpResponse('Method not allowed', status=405)
@@ -168,49 +260,63 @@ async def chat_api(request):
     try:
         data = json.loads(request.body)
         user_msg = data.get('message', '').strip()
-        history = data.get('messages', [])
 
         if not user_msg:
             return HttpResponse(
                 json.dumps({'error': 'Empty message'}),
                 status=400, content_type='application/json',
             )
-
-        messages = list(history[-4:])
-        if not messages or messages[-1].get('content') != user_msg:
-            messages.append({'role': 'user', 'content': user_msg})
+        await log_query('chat', user_msg)
+
+        # Older widgets still send their whole history; it only seeds a new conversation.
+        # Only plain turns: a client-supplied system message would break the prompt layers.
+        legacy_history = [
+            m for m in data.get('messages') or []
+            if isinstance(m, dict) and m.get('role') in ('user', 'assistant') and isinstance(m.get('content'), str)
+        ]
+        conversation_id, conversation = await load_conversation(data.get('conversation_id'), legacy_history)
+        client = get_ai_client()
+        conversation_event = {'conversation': conversation_id}
 
         cache_key = f"ai:exact:{hashlib.sha256(user_msg.lower().encode()).hexdigest()}"
-        cached = cache.get(cache_key)
+        cached = await async_cache.get(cache_key)
 
         if cached:
             async def stream_cached():
-                yield f"data: {json.dumps({'thinking': '⚡ Cached response — instant answer'})}\n\n"
-                for i in range(0, len(cached['content']), 60):
-                    yield f"data: {json.dumps({'content': cached['content'][i:i+60]})}\n\n"
-                metrics = {**cached['metrics'], 'cached': True}
-                yield f"data: {json.dumps({'done': True, 'metrics': metrics})}\n\n"
-
-            resp = StreamingHttpResponse(stream_cached(), content_type='text/event-stream')
-            resp['X-Accel-Buffering'] = 'no'
-            resp['Cache-Control'] = 'no-cache, no-transform'
-            resp['Content-Encoding'] = 'identity'
-            return resp
+                send = EventWriter()
+                yield send(conversation_event)
+                yield send({'thinking': '⚡ Cached response — instant answer'})
+                # Already complete: one event, not a simulated token stream.
+                yield send({'content': cached['content']})
+                metrics = {**cached['metrics'], 'cached': True, 'sse_events': send.events, 'sse_bytes': send.bytes}
+                yield send({'done': True, 'metrics': metrics})
+                await append_turn(conversation_id, conversation, user_msg, cached['content'], client)
 
-        client = get_ai_client()
+            return _sse_response(stream_cached())
 
         async def stream_response():
             accumulated = ""
+            send = EventWriter()
             try:
-                yield f"data: {json.dumps({'thinking': 'Searching knowledge base...'})}\n\n"
-                context_text = await generate_rag_context(user_msg, client)
-
-                if context_text == 'NO_RAG_NEEDED':
-                    yield f"data: {json.dumps({'thinking': 'Responding directly...'})}\n\n"
-                    messages.insert(0, {'role': 'system', 'content': "You are Ding AI for iooding.local. Be concise, use markdown."})
+                yield send(conversation_event)
+                yield send({'thinking': 'Searching knowledge base...'})
+                rag_skipped = []
+                context_text = await generate_rag_context(user_msg, client, skipped=rag_skipped)
+                # Inventory goes in even for small talk: it keeps the system prefix identical.
+                _, inventory = await get_site_inventory()
+
+                if rag_skipped:
+                    yield send({'rag': {'skipped': rag_skipped}})
+                    yield send({'thinking': 'Search ran long — answering from partial context...'})
+                elif context_text == 'NO_RAG_NEEDED':
+                    yield send({'thinking': 'Responding directly...'})
+                    context_text = ''
                 else:
-                    messages.insert(0, {'role': 'system', 'content': get_rag_system_prompt(context_text)})
-                    yield f"data: {json.dumps({'thinking': 'Context found — generating answer...'})}\n\n"
+                    yield send({'thinking': 'Context found — generating answer...'})
+                messages = build_chat_messages(
+                    prompt_history(conversation), user_msg, inventory, context_text,
+                    summary=conversation['summary'],
+                )
 
                 chat_resp = await client.chat(
                     model=None,
@@ -219,35 +325,120 @@ async def chat_api(request):
                     options={'temperature': 0.2, 'top_p': 0.9},
                 )
 
-                async for chunk in chat_resp:
+                # Tokens are batched into fewer events; the first one is sent immediately.
+                async for chunk in coalesce_deltas(
+                    chat_resp, settings.AI_STREAM_FLUSH_INTERVAL, settings.AI_STREAM_FLUSH_BYTES,
+                ):
                     content = chunk.get('message', {}).get('content', '')
                     if content:
                         accumulated += content
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                        yield send({'content': content})
 
                     if chunk.get('done'):
                         metrics = {
                             'total_duration': round(chunk.get('total_duration', 0) / 1e9, 2),
                             'eval_count': chunk.get('eval_count', 0),
                             'tokens_per_sec': round(chunk.get('eval_count', 0) / max(chunk.get('eval_duration', 1) / 1e9, 0.001), 1),
+                            'ttft': round(chunk.get('first_token_duration', 0) / 1e9, 3),
                             'cached': False,
+                            'rag_skipped': rag_skipped,
+                            'sse_events': send.events,
+                            'sse_bytes': send.bytes,
                         }
+                        yield send({'done': True, 'metrics': metrics})
                         if accumulated:
-                            cache.set(cache_key, {'content': accumulated, 'metrics': metrics}, timeout=3600)
-                        yield f"data: {json.dumps({'done': True, 'metrics': metrics})}\n\n"
+                            # An answer from partial context is not worth replaying for an hour.
+                            if not rag_skipped:
+                                await async_cache.set(cache_key, {'content': accumulated, 'metrics': metrics}, timeout=3600)
+                            await append_turn(conversation_id, conversation, user_msg, accumulated, client)
             except Exception as exc:
                 logger.error(f"Stream Error: {exc}")
-                yield f"data: {json.dumps({'error': str(exc)})}\n\n"
+                yield send({'error': str(exc)})
 
-        response = StreamingHttpResponse(stream_response(), content_type='text/event-stream')
-        response['X-Accel-Buffering'] = 'no'
-        response['Cache-Control'] = 'no-cache, no-transform'
-        response['Content-Encoding'] = 'identity'
-        return response
+        # The generation is buffered in a Redis Stream and outlives this response:
+        # a dropped client resumes via chat_stream, a duplicate tab attaches here.
+        stream_id = new_stream_id()
+        try:
+            running = await claim_generation(conversation_id, user_msg, stream_id)
+        except Exception as e:
+            logger.warning(f"Chat stream buffer unavailable, streaming directly: {e}")
+            return _sse_response(stream_response())
+        if running:
+            return _sse_response(read_stream(running))
+        conversation_event['stream'] = stream_id
+        start_generation(stream_id, stream_response(), conversation_id, user_msg)
+        return _sse_response(read_stream(stream_id))
     except Exception as exc:
         logger.exception('chat_api error: %s', exc)
         return HttpResponse(json.dumps({'error': str(exc)}), status=500, content_type='application/json')
 
+@rate_limit('stream')
+async def chat_stream(request, stream_id):
+    """
+    GET: resume a buffered chat generation after the event named by the
+    `Last-Event-ID` header (or ?last_event_id=); without one, replay it all.
+    DELETE: stop the generation (the widget's Stop button).
+    """
+    if request.method not in ('GET', 'DELETE'):
+        return HttpResponse('Method not allowed', status=405)
+    if not STREAM_ID_RE.match(stream_id):
+        raise Http404('No such stream')
+    if request.method == 'DELETE':
+        try:
+            await request_cancel(stream_id)
+        except Exception as e:
+            logger.warning(f"Chat stream cancel failed: {e}")
+            return HttpResponse(status=503)
+        return HttpResponse(status=204)
+    last_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    try:
+        found = await stream_exists(stream_id)
+    except Exception as e:
+        logger.warning(f"Chat stream resume failed: {e}")
+        return HttpResponse(json.dumps({'error': 'Stream buffer unavailable'}), status=503, content_type='application/json')
+    if not found:
+        raise Http404('No such stream')
+    return _sse_response(read_stream(stream_id, last_id))
+
+@rate_limit('prefetch')
+async def chat_prefetch(request):
+    """
+    Type-ahead hint from the chat widget: warm the retrieval caches for the
+    message being typed. Always 204 — the widget never waits on it.
+    """
+    if request.method != 'POST':
+        return HttpResponse('Method not allowed', status=405)
+    try:
+        message = json.loads(request.body).get('message', '')
+    except (ValueError, AttributeError):
+        return HttpResponse(status=400)
+    if isinstance(message, str):
+        try:
+            await prefetch_rag_context(message, get_ai_client())
+        except Exception as e:
+            logger.warning(f"Chat prefetch failed: {e}")
+    return HttpResponse(status=204)
+
+@condition(etag_func=sitemap_etag, last_modified_func=sitemap_last_modified)
+def sitemap_index(request):
+    return HttpResponse(render_index(request), content_type='application/xml')
+
+@condition(etag_func=sitemap_etag, last_modified_func=sitemap_last_modified)
+def sitemap_section(request, section):
+    try:
+        page = int(request.GET.get('p', 1))
+    except ValueError:
+        raise Http404('Invalid sitemap page')
+
+    xml = get_cached_section(section, page)
+    if xml is not None:
+        return HttpResponse(xml, content_type='application/xml')
+
+    stream = stream_section(request, section, page)
+    if stream is None:
+        raise Http404('No such sitemap page')
+    return StreamingHttpResponse(stream, content_type='application/xml')
+
 def privacy(request):
     return render(request, 'privacy.html')
 
@@ -260,6 +451,7 @@ def terms(request):
 def games(request):
     return render(request, 'games.html')
 
+@rate_limit('search')
 async def search_live(request):
     """
     HTMX live search endpoint.
@@ -268,6 +460,7 @@ async def search_live(request):
     query = request.GET.get('q', '').strip()
     if not query or len(query) < 2:
         return HttpResponse('')
+    await log_query('search', query)
 
     from asgiref.sync import sync_to_async
 
@@ -298,20 +491,25 @@ async def search_live(request):
     if len(results) < 2:
         try:
             client = get_ai_client()
-            embedding = await get_cached_embedding_async(query)
+            # Canonical form: the one the query log keeps, so warmed embeddings are hit.
+            embed_text = canonical_query(query)
+            embedding = await get_cached_embedding_async(embed_text)
+            if not embedding and not client.available:
+                raise CircuitOpenError("AI backend unavailable — skipping neural search")
             if not embedding:
-                emb_resp = await client.embeddings(model=None, prompt=query)
+                emb_resp = await client.embeddings(model=None, prompt=embed_text)
                 embedding = emb_resp['embedding']
-                await cache_embedding_async(query, embedding)
+                await cache_embedding_async(embed_text, embedding)
             
-            vector_results = await search_similar_async(embedding, top_k=5, max_distance=0.5)
+            # Post-level vectors only: live search needs posts, not passages.
+            vector_results = await search_posts_async(embedding, top_k=5, max_distance=0.5)
             if vector_results:
                 post_ids = [r['post_id'] for r in vector_results]
                 
                 @sync_to_async
                 def get_posts(ids):
                     order = {id: i for i, id in enumerate(ids)}
-                    qs = list(Post.published.filter(id__in=ids).select_related('author'))
+                    qs = list(Post.published.filter(id__in=ids).select_related('author').prefetch_related('tags'))
                     # Merge results if any classic existed, otherwise just neural
                     return qs
                 
@@ -33,9 +33,26 @@ run_migrate() {
     log "Running migrations..."
     python manage.py migrate --noinput
 
+    # New templates ship with this release — retire cached pages and ETags.
+    python manage.py shell -c "from blog.page_cache import bump_global_generation; bump_global_generation()" \
+        || log "  Page cache invalidation skipped (Redis unavailable)"
+
+    log "Backfilling responsive image variants..."
+    python manage.py generate_image_variants || log "  Skipped (media volume unavailable)"
+
+    # A snapshot shipped with the image restores the index in seconds instead of re-embedding it.
+    if [ -n "${EMBEDDING_SNAPSHOT_DIR-}" ] && [ -f "${EMBEDDING_SNAPSHOT_DIR}/manifest.json" ]; then
+        log "Restoring vector index from snapshot (if empty)..."
+        python manage.py import_embeddings "${EMBEDDING_SNAPSHOT_DIR}" --if-empty || log "  Snapshot restore skipped"
+    fi
+
     log "Attempting RAG index sync..."
     python manage.py index_posts 2>/dev/null || log "  Skipped (Ollama/Redis unavailable)"
 
+    # After indexing, so embeddings never wait on the completion model.
+    log "Generating missing semantic summaries..."
+    python manage.py summarize_posts 2>/dev/null || log "  Skipped (AI host unavailable)"
+
     if [ -n "${DJANGO_SUPERUSER_USERNAME-}" ] && [ -n "${DJANGO_SUPERUSER_PASSWORD-}" ]; then
         log "Ensuring superuser '${DJANGO_SUPERUSER_USERNAME}' exists..."
         python manage.py shell -c "
@@ -52,8 +69,19 @@ else:
     fi
 }
 
+# Before the server listens, so readiness only passes once the caches are warm.
+# Bounded: the startupProbe allows 150s and the app works cold anyway.
+run_warmup() {
+    if [ "${CACHE_WARMUP:-true}" != "true" ]; then
+        return
+    fi
+    log "Warming caches (inventory, popular pages, query embeddings)..."
+    python manage.py warm_caches --time-budget "${CACHE_WARMUP_BUDGET:-60}" || log "  Warmup skipped"
+}
+
 run_static() {
     log "Collecting static files..."
+    python manage.py build_assets
     python manage.py collectstatic --noinput --clear
 }
 
@@ -70,6 +98,10 @@ case "${1:-}" in
         run_migrate
         log "=== Full deploy complete ==="
         ;;
+    gunicorn)
+        run_warmup
+        exec "$@"
+        ;;
     *)
         exec "$@"
         ;;
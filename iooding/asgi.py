@@ -9,3 +9,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iooding.settings')
 
 application = get_asgi_application()
+
+# Only server workers import this module, so management commands never probe.
+from blog.health import start_health_prober  # noqa: E402
+start_health_prober()
@@ -28,6 +28,46 @@ AI_API_KEY = env('AI_API_KEY', default=env('LM_STUDIO_API_KEY', default='mlx'))
 AI_COMPLETION_MODEL = env('AI_COMPLETION_MODEL', default=env('LM_STUDIO_COMPLETION_MODEL', default='gemma-4-e2b-it-optiq'))
 AI_EMBEDDING_MODEL = env('AI_EMBEDDING_MODEL', default=env('LM_STUDIO_EMBEDDING_MODEL', default='nomic-embed-text'))
 
+# One pooled keep-alive transport; split timeouts so a dead host fails in seconds, not minutes.
+AI_CONNECT_TIMEOUT = env.float('AI_CONNECT_TIMEOUT', default=3.0)
+AI_POOL_TIMEOUT = env.float('AI_POOL_TIMEOUT', default=5.0)          # waiting for a free connection
+AI_READ_TIMEOUT = env.float('AI_READ_TIMEOUT', default=120.0)        # between bytes / whole non-stream reply
+AI_FIRST_BYTE_TIMEOUT = env.float('AI_FIRST_BYTE_TIMEOUT', default=30.0)  # until the first streamed token
+AI_EMBEDDING_TIMEOUT = env.float('AI_EMBEDDING_TIMEOUT', default=10.0)
+AI_EMBEDDING_RETRIES = env.int('AI_EMBEDDING_RETRIES', default=2)
+AI_MAX_CONNECTIONS = env.int('AI_MAX_CONNECTIONS', default=20)
+AI_MAX_KEEPALIVE_CONNECTIONS = env.int('AI_MAX_KEEPALIVE_CONNECTIONS', default=10)
+AI_KEEPALIVE_EXPIRY = env.float('AI_KEEPALIVE_EXPIRY', default=60.0)
+# Circuit breaker: fail fast (and skip neural search) after repeated backend failures.
+AI_BREAKER_THRESHOLD = env.int('AI_BREAKER_THRESHOLD', default=5)
+AI_BREAKER_RESET = env.float('AI_BREAKER_RESET', default=30.0)
+# Extra chat request fields asking the server to keep/reuse the prompt KV cache,
+# e.g. '{"cache_prompt": true}' (llama.cpp) or '{"keep_alive": "30m"}' (Ollama).
+AI_PROMPT_CACHE_HINTS = env.json('AI_PROMPT_CACHE_HINTS', default={})
+# Server-side chat history: recent turns verbatim within the budget, older ones summarized.
+AI_CONVERSATION_TTL = env.int('AI_CONVERSATION_TTL', default=60 * 60 * 24 * 7)
+AI_HISTORY_TOKEN_BUDGET = env.int('AI_HISTORY_TOKEN_BUDGET', default=1200)
+AI_SUMMARY_TOKEN_BUDGET = env.int('AI_SUMMARY_TOKEN_BUDGET', default=250)
+# Retrieved excerpts per question (approximate tokens).
+AI_CONTEXT_TOKEN_BUDGET = env.int('AI_CONTEXT_TOKEN_BUDGET', default=400)
+# Retrieval latency budget (seconds) before the answer starts; late stages are skipped.
+AI_RAG_DEADLINE = env.float('AI_RAG_DEADLINE', default=1.5)
+# Type-ahead retrieval prefetches running at once per worker; extra ones are dropped.
+AI_PREFETCH_MAX_INFLIGHT = env.int('AI_PREFETCH_MAX_INFLIGHT', default=4)
+# Chat SSE framing: tokens after the first are batched until this interval or size.
+AI_STREAM_FLUSH_INTERVAL = env.float('AI_STREAM_FLUSH_INTERVAL', default=0.05)
+AI_STREAM_FLUSH_BYTES = env.int('AI_STREAM_FLUSH_BYTES', default=256)
+# Generations are buffered in Redis Streams so clients can resume (Last-Event-ID)
+# or a duplicate tab can attach; kept this long after the last event.
+AI_STREAM_BUFFER_TTL = env.int('AI_STREAM_BUFFER_TTL', default=300)
+# Post semantic summaries are generated in the background; cap concurrent completions.
+AI_POST_SUMMARY_CONCURRENCY = env.int('AI_POST_SUMMARY_CONCURRENCY', default=2)
+
+# ─── Health ───────────────────────────────────────────────────────────────────
+# One worker per deployment probes DB/Redis/AI and publishes a snapshot to Redis.
+HEALTH_PROBER_ENABLED = env.bool('HEALTH_PROBER_ENABLED', default=True)
+HEALTH_PROBE_INTERVAL = env.float('HEALTH_PROBE_INTERVAL', default=10.0)
+
 
 
 # ─── Applications ─────────────────────────────────────────────────────────────
@@ -137,11 +177,17 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STORAGES = {
     'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
-    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+    # Hashed names + gzip/Brotli; WhiteNoise serves hashed files as immutable.
+    'staticfiles': {'BACKEND': 'iooding.storage.StaticFilesStorage'},
 }
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# AVIF derivatives are smaller than WebP but slow to encode on the 400m CPU limit.
+IMAGE_AVIF_ENABLED = env.bool('IMAGE_AVIF_ENABLED', default=False)
+# Internal nginx location aliased to MEDIA_ROOT (e.g. '/_media/'). When set, /media/
+# responses carry X-Accel-Redirect and the ingress streams the file; empty = app streams.
+MEDIA_ACCEL_REDIRECT_PREFIX = env('MEDIA_ACCEL_REDIRECT_PREFIX', default='')
 
 
 
@@ -0,0 +1,13 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Content-hashed, gzip + Brotli precompressed static files.
+    Vendor files reference source maps we don't ship, so those references are
+    left alone instead of failing collectstatic.
+    """
+    patterns = tuple(
+        (extension, tuple(p for p in extension_patterns if 'sourceMappingURL' not in str(p)))
+        for extension, extension_patterns in CompressedManifestStaticFilesStorage.patterns
+    )
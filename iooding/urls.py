@@ -21,24 +21,19 @@ from blog import views
 from django.conf import settings
 from django.conf.urls.static import static
 
-from django.contrib.sitemaps.views import sitemap
-from blog.sitemaps import PostSitemap
-
-sitemaps = {
-    'posts': PostSitemap,
-}
-
 from django.urls import re_path
-from django.views.static import serve
+from blog.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', include([
         path('', views.health_check, name='health_check'),
+        path('ready/', views.health_ready, name='health_ready'),
     ])),
     path('', include('blog.urls', namespace='blog')),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps},name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<slug:section>.xml', views.sitemap_section, name='sitemap_section'),
     
     # Explicitly serve media files (user uploads) from the PersistentVolume in production
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    re_path(r'^media/(?P<path>.*)$', serve_media, name='media'),
 ]
@@ -1,6 +1,12 @@
 // --- AI Sidebar System Logic: Advanced Developer Interface ---
 let chatHistory = [], lastEnterTime = 0, abortController = null, isGenerating = false, currentAiDiv = null;
+let currentStreamId = null; // server-side generation of the answer in progress
 const MAX_HISTORY = 20;
+// Type-ahead retrieval: after a pause in typing, ask the server to warm the RAG caches.
+const PREFETCH_DEBOUNCE_MS = 700, PREFETCH_MIN_CHARS = 12;
+let aiOnline = false, prefetchTimer = null, lastPrefetched = '';
+// A dropped answer stream is resumed from its last event id this many times.
+const STREAM_RESUME_ATTEMPTS = 3;
 
 function getCookie(name) {
     let cookieValue = null;
@@ -33,6 +39,7 @@ document.addEventListener('DOMContentLoaded', () => {
     userInput.addEventListener('input', () => {
         resizeInput(userInput);
         localStorage.setItem('ai_user_input_cache', userInput.value);
+        schedulePrefetch(userInput.value);
     });
 
     userInput.addEventListener('keydown', (e) => {
@@ -80,6 +87,7 @@ async function checkAiStatus() {
     try {
         const res = await fetch('/api/chat/status/');
         const data = await res.json();
+        aiOnline = !!data.online;
         if (data.online) {
             statusText.innerHTML = '<span class="pulse"></span> Online';
             if (welcomeBox) welcomeBox.innerHTML = '<p>Interface active. Powering high-performance inference. How can I assist with your technical journey today?</p>';
@@ -94,6 +102,22 @@ async function checkAiStatus() {
     }
 }
 
+function schedulePrefetch(value) {
+    clearTimeout(prefetchTimer);
+    const text = value.trim();
+    if (!aiOnline || text.length < PREFETCH_MIN_CHARS || text === lastPrefetched) return;
+    prefetchTimer = setTimeout(() => {
+        if (isGenerating) return;
+        lastPrefetched = text;
+        // Fire-and-forget hint; the server drops it when busy or rate limited.
+        fetch('/api/chat/prefetch/', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': getCookie('iooding_csrftoken') },
+            body: JSON.stringify({ message: text }),
+        }).catch(() => {});
+    }, PREFETCH_DEBOUNCE_MS);
+}
+
 let touchStartY = 0;
 function initMobileGestures() {
     const sidebar = document.getElementById('ai-sidebar');
@@ -191,7 +215,7 @@ function addAssistantMessageUI(content) {
     div.innerHTML = `<div class="msg-content">${marked.parse(content)}</div>`;
     div.appendChild(createActionButtons(content, false));
     v.appendChild(div);
-    div.querySelectorAll('pre code').forEach(hljs.highlightElement);
+    highlightCode(div);
 
     // DOM Virtualization: Limit messages in DOM
     const messages = v.querySelectorAll('.user-wrapper, .ai-msg:not(.system-msg)');
@@ -200,8 +224,36 @@ function addAssistantMessageUI(content) {
     }
 }
 
+// highlight.js only ships with pages that contain code — fetch it on demand for chat answers.
+let hljsLoader = null;
+function highlightCode(root) {
+    if (!root.querySelector('pre code')) return;
+    if (!window.hljs && !hljsLoader) {
+        hljsLoader = new Promise((resolve, reject) => {
+            const css = document.createElement('link');
+            css.rel = 'stylesheet'; css.href = document.body.dataset.hljsCss;
+            document.head.appendChild(css);
+            const script = document.createElement('script');
+            script.src = document.body.dataset.hljsJs; script.onload = resolve; script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+    Promise.resolve(window.hljs || hljsLoader)
+        .then(() => root.querySelectorAll('pre code').forEach(hljs.highlightElement))
+        .catch(() => {});
+}
+
 function stopGeneration(cancel = false) {
     if (abortController) { abortController.abort(); abortController = null; }
+    // The generation runs server-side independently of this connection; stop it too.
+    if (currentStreamId) {
+        fetch(`/api/chat/stream/${currentStreamId}/`, {
+            method: 'DELETE',
+            headers: { 'X-CSRFToken': getCookie('iooding_csrftoken') },
+            keepalive: true
+        }).catch(() => {});
+        currentStreamId = null;
+    }
     if (currentAiDiv) {
         const c = currentAiDiv.querySelector('.msg-content');
         if (c) {
@@ -223,12 +275,35 @@ function setGeneratingState(active) {
     btn.querySelector('.stop-icon').style.display = active ? 'block' : 'none';
 }
 
+// Server-Sent Events over fetch: calls onEvent(data, lastId) per `data:` line.
+async function readEvents(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '', id = null;
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) return;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        for (const line of lines) {
+            if (line.startsWith('id: ')) { id = line.substring(4); continue; }
+            if (!line.startsWith('data: ')) continue;
+            let data;
+            try { data = JSON.parse(line.substring(6)); } catch { continue; }
+            onEvent(data, id);
+        }
+    }
+}
+
 async function sendMessage() {
     const input = document.getElementById('ai-user-input');
     const text = input.value.trim();
     if (!text) return;
 
     if (isGenerating) stopGeneration(true);
+    clearTimeout(prefetchTimer);
 
     addUserMessageUI(text);
     input.value = ''; resizeInput(input);
@@ -236,6 +311,7 @@ async function sendMessage() {
     scrollToBottom(true);
 
     abortController = new AbortController();
+    const signal = abortController.signal;
     setGeneratingState(true);
 
     const v = document.getElementById('chat-messages');
@@ -247,92 +323,114 @@ async function sendMessage() {
     currentAiDiv = aiDiv;
     scrollToBottom(true);
 
-    let fullContent = "", fullThinking = "";
+    let fullContent = "", fullThinking = "", streamId = null;
+    const conversationId = localStorage.getItem('ai_conversation_id');
     try {
-        const res = await fetch('/api/chat/', {
+        let res = await fetch('/api/chat/', {
             method: 'POST',
             headers: { 
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCookie('iooding_csrftoken')
             },
-            body: JSON.stringify({ message: text, messages: chatHistory }),
-            signal: abortController.signal
+            // History lives server-side; only the conversation id travels
+            // (local history is sent once, to seed a conversation that has none yet).
+            body: JSON.stringify(conversationId
+                ? { message: text, conversation_id: conversationId }
+                : { message: text, messages: chatHistory }),
+            signal
         });
 
-        if (!res.ok) throw new Error(`Status: ${res.status}`);
-        const reader = res.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = '';
         // Track last paint time for throttling. 0 means "never painted" → first token paints immediately.
         let lastRenderTime = 0;
         const RENDER_MS = 16; // ~60fps max re-render rate
+        let lastEventId = null, finished = false;
 
         aiDiv.querySelector('.msg-content').innerHTML = '';
 
-        while (true) {
-            const { value, done } = await reader.read();
-            if (done) break;
-            buffer += decoder.decode(value, { stream: true });
-            const lines = buffer.split('\n');
-            buffer = lines.pop();
-
-            for (const line of lines) {
-                if (!line.startsWith('data: ')) continue;
-                let data;
-                try { data = JSON.parse(line.substring(6)); } catch { continue; }
-
-                if (data.error) throw new Error(data.error);
-
-                if (data.thinking) {
-                    const box = aiDiv.querySelector('.thinking-box');
-                    box.style.display = 'block';
-                    // Replace status instead of appending for a cleaner "status update" feel
-                    box.querySelector('.thinking-content').textContent = `• ${data.thinking}`;
-                }
-
-                if (data.content) {
-                    fullContent += data.content;
-                    const now = performance.now();
-                    
-                    // PERFORMANCE: 
-                    // 1. If it's the very first token, show it as raw text immediately.
-                    // 2. Otherwise, throttle markdown parsing to ~60fps to keep CPU low.
-                    if (lastRenderTime === 0) {
-                        aiDiv.querySelector('.msg-content').textContent = fullContent;
-                        scrollToBottom();
-                        lastRenderTime = now;
-                    } else if (now - lastRenderTime >= RENDER_MS) {
-                        aiDiv.querySelector('.msg-content').innerHTML = marked.parse(fullContent);
-                        scrollToBottom();
-                        lastRenderTime = now;
-                    }
-                }
+        const onEvent = (data, id) => {
+            if (id) lastEventId = id;
+            if (data.error) throw new Error(data.error);
+            if (data.conversation) {
+                localStorage.setItem('ai_conversation_id', data.conversation);
+                if (data.stream) streamId = currentStreamId = data.stream;
+                return;
+            }
+            if (data.thinking) {
+                const box = aiDiv.querySelector('.thinking-box');
+                box.style.display = 'block';
+                // Replace status instead of appending for a cleaner "status update" feel
+                box.querySelector('.thinking-content').textContent = `• ${data.thinking}`;
+            }
 
-                if (data.done && data.metrics) {
-                    // Final render: full content + code highlighting
+            if (data.content) {
+                fullContent += data.content;
+                const now = performance.now();
+                
+                // PERFORMANCE: 
+                // 1. If it's the very first token, show it as raw text immediately.
+                // 2. Otherwise, throttle markdown parsing to ~60fps to keep CPU low.
+                if (lastRenderTime === 0) {
+                    aiDiv.querySelector('.msg-content').textContent = fullContent;
+                    scrollToBottom();
+                    lastRenderTime = now;
+                } else if (now - lastRenderTime >= RENDER_MS) {
                     aiDiv.querySelector('.msg-content').innerHTML = marked.parse(fullContent);
-                    aiDiv.querySelectorAll('pre code').forEach(hljs.highlightElement);
-                    const m = data.metrics;
-                    if (m.cached) {
-                        aiDiv.querySelector('.msg-metrics').innerHTML =
-                            `<span class="cached-badge">⚡ Cached</span>&nbsp;<span>${m.eval_count} tokens</span>`;
-                        document.getElementById('ai-stats-realtime').textContent = '⚡ Cache';
-                    } else {
-                        const speed = (m.tokens_per_sec != null && !isNaN(m.tokens_per_sec))
-                            ? m.tokens_per_sec.toFixed(1)
-                            : (m.eval_count / (m.total_duration || 0.001)).toFixed(1);
-                        aiDiv.querySelector('.msg-metrics').innerHTML =
-                            `<span>${m.eval_count} tokens</span> • <span>${speed} t/s</span> • <span>${(m.total_duration || 0).toFixed(2)}s</span>`;
-                        document.getElementById('ai-stats-realtime').textContent = `${speed} t/s`;
-                    }
                     scrollToBottom();
+                    lastRenderTime = now;
+                }
+            }
+
+            if (data.done && data.metrics) {
+                finished = true;
+                // Final render: full content + code highlighting
+                aiDiv.querySelector('.msg-content').innerHTML = marked.parse(fullContent);
+                highlightCode(aiDiv);
+                const m = data.metrics;
+                if (m.cached) {
+                    aiDiv.querySelector('.msg-metrics').innerHTML =
+                        `<span class="cached-badge">⚡ Cached</span>&nbsp;<span>${m.eval_count} tokens</span>`;
+                    document.getElementById('ai-stats-realtime').textContent = '⚡ Cache';
+                } else {
+                    const speed = (m.tokens_per_sec != null && !isNaN(m.tokens_per_sec))
+                        ? m.tokens_per_sec.toFixed(1)
+                        : (m.eval_count / (m.total_duration || 0.001)).toFixed(1);
+                    aiDiv.querySelector('.msg-metrics').innerHTML =
+                        `<span title="${m.sse_events || '?'} events, ${m.sse_bytes || '?'} bytes">${m.eval_count} tokens</span> • <span>${speed} t/s</span> • <span>${(m.total_duration || 0).toFixed(2)}s</span>` +
+                        (m.ttft != null ? ` • <span>TTFT ${m.ttft.toFixed(2)}s</span>` : '') +
+                        (m.rag_skipped && m.rag_skipped.length ? ` • <span title="Skipped: ${m.rag_skipped.join(', ')}">partial context</span>` : '');
+                    document.getElementById('ai-stats-realtime').textContent = `${speed} t/s`;
                 }
+                scrollToBottom();
             }
+        };
+
+        // Generations are buffered server-side: after a network drop, pick up
+        // after the last event received instead of asking again.
+        for (let resumes = 0; ; resumes++) {
+            if (res) {
+                try {
+                    if (!res.ok) throw new Error(`Status: ${res.status}`);
+                    await readEvents(res, onEvent);
+                } catch (err) {
+                    // Network failures surface as TypeError; anything else is final.
+                    if (!(err instanceof TypeError) || !streamId) throw err;
+                }
+            }
+            if (finished || !streamId) break;
+            if (resumes >= STREAM_RESUME_ATTEMPTS) throw new Error('Connection lost');
+            await new Promise(r => setTimeout(r, 500 * (resumes + 1)));
+            res = await fetch(`/api/chat/stream/${streamId}/`, {
+                headers: lastEventId ? { 'Last-Event-ID': lastEventId } : {},
+                signal
+            }).catch(err => { if (err.name === 'AbortError') throw err; return null; });
         }
         if (fullContent) { aiDiv.appendChild(createActionButtons(fullContent, false)); saveHistory(text, fullContent); }
     } catch (err) {
         if (err.name !== 'AbortError') aiDiv.querySelector('.msg-content').innerHTML = `<div style="color:#ff3b30;">${err.message || 'Connection failed'}</div>`;
-    } finally { setGeneratingState(false); abortController = null; currentAiDiv = null; }
+    } finally {
+        setGeneratingState(false); abortController = null; currentAiDiv = null;
+        if (currentStreamId === streamId) currentStreamId = null;
+    }
 }
 
 function saveHistory(u, a) {
@@ -364,6 +462,7 @@ function clearHistory() {
 function confirmClearHistory() {
     chatHistory = [];
     localStorage.removeItem('ai_chat_history');
+    localStorage.removeItem('ai_conversation_id');
     const v = document.getElementById('chat-messages'), w = v.querySelector('.system-msg');
     v.innerHTML = ''; if (w) v.appendChild(w);
     document.getElementById('ai-clear-modal').style.display = 'none';
@@ -384,4 +483,11 @@ function handleReply(id) {
 function handleCancel(id) {
     const container = document.getElementById(`reply-form-container-${id}`);
     if (container) container.style.display = 'none';
-}
\ No newline at end of file
+}
+// Reply forms arrive via HTMX after the click — focus them once swapped in.
+document.addEventListener('htmx:afterSwap', (e) => {
+    if (e.detail.target.id && e.detail.target.id.startsWith('reply-form-container-')) {
+        const input = e.detail.target.querySelector('textarea, input[type="text"]');
+        if (input) input.focus();
+    }
+});